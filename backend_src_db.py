@@ -0,0 +1,302 @@
+"""The application's single database handle.
+
+Every model and route imports ``db`` from here, so the app has one
+metadata registry, one scoped session and one engine (and connection
+pool) per worker process. Pool settings come from the app config:
+
+    DB_POOL_SIZE       connections kept open (default 5)
+    DB_MAX_OVERFLOW    extra connections allowed under load (default 10)
+    DB_POOL_TIMEOUT    seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE    seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING   test connections before use (default True)
+
+Values already present in SQLALCHEMY_ENGINE_OPTIONS take precedence.
+
+SQLite connections also get a pragma profile when they are opened:
+SQLITE_PRAGMA_PROFILE picks one of SQLITE_PRAGMA_PROFILES ('production'
+by default, 'default' leaves SQLite's own settings) and SQLITE_PRAGMAS
+overrides individual values.
+
+The database itself comes from DATABASE_URL, so several app servers can
+share one PostgreSQL database; without it the app uses the local SQLite
+file. SQL that differs between the two (date bucketing, upserts) goes
+through the helpers at the bottom of this module.
+
+Views decorated with @use_replica read from SQLALCHEMY_REPLICA_URI when
+one is configured. Writes, flushes and anything that is not a SELECT
+stay on the primary, and so do all reads of a user who wrote in the
+last REPLICA_STICKY_SECONDS (default 10), so they see their own changes.
+A replica that fails to connect is skipped for REPLICA_RETRY_SECONDS
+(default 30). Reads whose results outlive the request, such as shared
+cache fills, go through read_from_primary() so replica lag is not cached.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, session as user_session
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Date, cast, event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """Sends the SELECTs of @use_replica views to the replica engine"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not (self._flushing or self.info.get('wrote')) and _reads_from_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+SQLITE_PRAGMA_PROFILES = {
+    'default': {},
+    # WAL lets readers run alongside the single writer; NORMAL sync is
+    # durable in WAL mode except for the last commits on power loss
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -32000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+}
+
+POOL_DEFAULTS = {
+    'pool_size': ('DB_POOL_SIZE', 5),
+    'max_overflow': ('DB_MAX_OVERFLOW', 10),
+    'pool_timeout': ('DB_POOL_TIMEOUT', 30),
+    'pool_recycle': ('DB_POOL_RECYCLE', 1800),
+    'pool_pre_ping': ('DB_POOL_PRE_PING', True),
+}
+
+def database_uri(url, default):
+    """SQLAlchemy URI for a DATABASE_URL value, falling back to default"""
+    if not url:
+        return default
+    # Hosting providers still hand out the scheme SQLAlchemy 1.4 dropped
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def _in_memory(uri):
+    return uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri)
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS with the pool settings filled in"""
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    # In-memory SQLite uses a single shared connection, which has no pool to size
+    if _in_memory(config.get('SQLALCHEMY_DATABASE_URI', '')):
+        return options
+    for option, (key, default) in POOL_DEFAULTS.items():
+        options.setdefault(option, config.get(key, default))
+    return options
+
+def sqlite_pragmas(config):
+    """The pragma name -> value mapping configured for SQLite connections"""
+    profile = config.get('SQLITE_PRAGMA_PROFILE', 'production')
+    if profile not in SQLITE_PRAGMA_PROFILES:
+        raise ValueError(f'Unknown SQLITE_PRAGMA_PROFILE: {profile}')
+    return {**SQLITE_PRAGMA_PROFILES[profile], **config.get('SQLITE_PRAGMAS', {})}
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+def read_pragmas(connection, names):
+    """Current values of the given pragmas on a live connection"""
+    return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
+
+class ReplicaState:
+    """Routing settings and health of the read replica"""
+
+    def __init__(self, config):
+        self.sticky_seconds = config.get('REPLICA_STICKY_SECONDS', 10)
+        self.retry_seconds = config.get('REPLICA_RETRY_SECONDS', 30)
+        self.down_until = 0
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    def on_error(self, context):
+        # No connection means the replica could not be reached at all
+        if context.connection is None or context.is_disconnect:
+            self.down_until = time.monotonic() + self.retry_seconds
+
+def _replica():
+    return current_app.extensions.get('db_replica')
+
+def _reads_from_replica(clause):
+    if not (has_request_context() and g.get('use_replica')) or g.get('db_wrote'):
+        return False
+    replica = _replica()
+    if replica is None or not replica.available:
+        return False
+    if clause is not None and not clause.is_select:
+        return False
+    wrote_at = user_session.get('db_write_at')
+    return wrote_at is None or time.time() - wrote_at > replica.sticky_seconds
+
+def use_replica(view):
+    """Let a read-only view run its queries on the replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def read_from_primary():
+    """Run the enclosed queries on the primary, even inside a @use_replica view"""
+    previous = g.get('use_replica', False)
+    g.use_replica = False
+    try:
+        yield
+    finally:
+        g.use_replica = previous
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_bulk_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(session):
+    if not (session.info.pop('wrote', False) and has_request_context()):
+        return
+    replica = _replica()
+    # Without a replica in rotation every read already goes to the primary,
+    # so there is nothing to stick to and no reason to send a cookie
+    if replica is None or not replica.available:
+        return
+    # Kept in the user's cookie so every app server honours it
+    g.db_wrote = True
+    user_session['db_write_at'] = time.time()
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
+
+def _count_checkouts(counters):
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        counters['checkouts'] += 1
+    return on_checkout
+
+def engine_names():
+    named = {'primary': db.engines[None]}
+    if REPLICA_BIND in db.engines:
+        named['replica'] = db.engines[REPLICA_BIND]
+    return named
+
+def pool_metrics(app):
+    """Pool usage per engine name ('primary', 'replica')"""
+    metrics = {}
+    for name, engine in engine_names().items():
+        pool = engine.pool
+        metrics[name] = {
+            'status': pool.status(),
+            # Sizing figures only exist on queue-based pools
+            **{
+                key: getattr(pool, key)()
+                for key in ('size', 'checkedin', 'checkedout', 'overflow')
+                if hasattr(pool, key)
+            },
+            **app.extensions['db_pool_counters'][name]
+        }
+    return metrics
+
+def init_db(app):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = replica_uri
+        app.extensions['db_replica'] = ReplicaState(app.config)
+    db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            pragmas = sqlite_pragmas(app.config)
+            app.extensions['sqlite_pragmas'] = pragmas
+            if pragmas:
+                event.listen(db.engine, 'connect', _apply_pragmas(pragmas))
+
+        if replica_uri:
+            replica = db.engines[REPLICA_BIND]
+            event.listen(replica, 'handle_error', app.extensions['db_replica'].on_error)
+            if replica.dialect.name == 'sqlite':
+                # A stand-in replica file: refuse any write that slips through
+                event.listen(replica, 'connect', _apply_pragmas({
+                    **sqlite_pragmas(app.config), 'query_only': 'ON'
+                }))
+
+        counters = {}
+        for name, engine in engine_names().items():
+            counters[name] = {'checkouts': 0}
+            event.listen(engine.pool, 'checkout', _count_checkouts(counters[name]))
+        app.extensions['db_pool_counters'] = counters
+
+class day_of(FunctionElement):
+    """Calendar day of a DATE/DATETIME column, as a date on every dialect"""
+    type = Date()
+    name = 'day_of'
+    inherit_cache = True
+
+@compiles(day_of)
+def _day_of(element, compiler, **kw):
+    return compiler.process(cast(*element.clauses, Date), **kw)
+
+@compiles(day_of, 'sqlite')
+def _day_of_sqlite(element, compiler, **kw):
+    # CAST(... AS DATE) gives a number on SQLite; date() gives 'YYYY-MM-DD',
+    # which the Date type parses on the way out
+    return compiler.process(func.date(*element.clauses), **kw)
+
+class nocase(FunctionElement):
+    """A text column compared case-insensitively.
+
+    Renders as ``column COLLATE NOCASE`` on SQLite and ``lower(column)``
+    elsewhere; an index on the same expression serves range comparisons.
+    """
+    name = 'nocase'
+    inherit_cache = True
+
+    @property
+    def type(self):
+        return self.clauses.clauses[0].type
+
+@compiles(nocase)
+def _nocase(element, compiler, **kw):
+    return compiler.process(func.lower(*element.clauses), **kw)
+
+@compiles(nocase, 'sqlite')
+def _nocase_sqlite(element, compiler, **kw):
+    column, = element.clauses
+    return compiler.process(column.collate('NOCASE'), **kw)
+
+UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+def upsert(table, dialect=None):
+    """INSERT ... ON CONFLICT for the named dialect, or the session's"""
+    dialect = dialect or db.session.get_bind().dialect.name
+    if dialect not in UPSERT_INSERTS:
+        raise NotImplementedError(f'Upserts are not supported on {dialect}')
+    return UPSERT_INSERTS[dialect](table)
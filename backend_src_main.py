@@ -5,7 +5,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
-from src.models.user import db
+from src.db import database_uri, init_db
+from src.services.auth import init_auth
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.courses import courses_bp
@@ -14,6 +15,10 @@ from src.routes.membership import membership_bp
 from src.routes.marketing import marketing_bp
 from src.routes.admin import admin_bp
 from src.routes.setup import setup_bp
+from src.services.progress_buffer import watch_time_buffer
+from src.services.metrics import metrics_cli
+from src.services.search import search_index, search_cli
+from src.migrations.runner import db_cli, check_schema
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -32,18 +37,34 @@ app.register_blueprint(admin_bp, url_prefix='/api/admin')
 app.register_blueprint(setup_bp, url_prefix='/api/setup')
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(
+    os.environ.get('DATABASE_URL'),
+    default=f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
+# Optional read replica for reports and catalog reads (see src/db.py)
+if os.environ.get('DATABASE_REPLICA_URL'):
+    app.config['SQLALCHEMY_REPLICA_URI'] = database_uri(os.environ['DATABASE_REPLICA_URL'], default=None)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# FLASK_<KEY> environment variables override any setting, e.g.
+# FLASK_DB_POOL_SIZE=20 or FLASK_SQLALCHEMY_ENGINE_OPTIONS='{"echo": true}'
+app.config.from_prefixed_env()
+init_db(app)
+init_auth(app)
+watch_time_buffer.init_app(app)
+app.cli.add_command(metrics_cli)
+search_index.init_app(app)
+app.cli.add_command(search_cli)
+app.cli.add_command(db_cli)
 
 # Import all models to ensure they are registered
 from src.models.course import Course, CourseModule, CourseLesson, CourseEnrollment, LessonProgress
 from src.models.booking import Service, Booking, AvailableSlot
 from src.models.membership import MembershipPlan, Subscription, Payment
 from src.models.marketing import NewsletterSubscriber, EmailCampaign, LandingPage, Coupon
+from src.models.metrics import DailyMetric, DailyBookingMetric
 
-with app.app_context():
-    db.create_all()
+# Schema changes are applied with 'flask db upgrade'; startup only checks the version
+check_schema(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,164 @@
+"""Versioned schema migrations.
+
+Each src/migrations/vNNNN_<name>.py module defines ``version``,
+``description`` and ``upgrade(connection)``, and may define
+``after_upgrade()`` for data work that needs the committed schema (index
+rebuilds, backfills). Applied versions are recorded in the schema_version
+table once both steps succeed, so a failed hook leaves the migration
+pending and ``upgrade(connection)`` must be safe to run again.
+``flask db upgrade`` applies pending migrations, each in its own
+transaction; the app itself only reads the current version at startup.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select
+from src.db import db
+import src.migrations
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+schema_version = Table(
+    'schema_version', metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+MIGRATION_MODULE = re.compile(r'v\d{4}_\w+$')
+
+# Tables of the original create_all() bootstrap, which every migration
+# assumes exist
+BASELINE_TABLES = [
+    'users', 'services', 'bookings', 'available_slots', 'courses', 'course_modules',
+    'course_lessons', 'course_enrollments', 'lesson_progress', 'newsletter_subscribers',
+    'email_campaigns', 'landing_pages', 'coupons', 'membership_plans', 'subscriptions', 'payments',
+]
+
+def load_migrations():
+    """Migration modules sorted by version"""
+    migrations = [
+        importlib.import_module(f'{src.migrations.__name__}.{info.name}')
+        for info in pkgutil.iter_modules(src.migrations.__path__)
+        if MIGRATION_MODULE.match(info.name)
+    ]
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f'Duplicate migration versions: {versions}')
+    return migrations
+
+def latest_version():
+    migrations = load_migrations()
+    return migrations[-1].version if migrations else 0
+
+def current_version(connection):
+    if not inspect(connection).has_table('schema_version'):
+        return 0
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+def _record(connection, migration):
+    connection.execute(schema_version.insert().values(
+        version=migration.version,
+        description=migration.description,
+        applied_at=datetime.utcnow()
+    ))
+
+def _create_baseline_tables(connection):
+    """Create whichever original tables an unversioned database lacks.
+
+    The old bootstrap could leave only some of them (the shipped app.db has
+    just users). Missing tables are created from the current models, whose
+    later columns and indexes the migrations then find already in place.
+    """
+    db.metadata.create_all(connection, tables=[db.metadata.tables[name] for name in BASELINE_TABLES])
+
+def _after_upgrade(migration):
+    if hasattr(migration, 'after_upgrade'):
+        migration.after_upgrade()
+
+def upgrade(target=None, echo=logger.info):
+    """Apply pending migrations up to target (default: latest); returns the new version.
+
+    An empty database gets the current model schema in one step and is
+    stamped with the latest version instead of replaying every migration.
+    An unversioned database with only some of the original tables gets the
+    missing ones before the migrations run.
+    """
+    migrations = load_migrations()
+    latest = migrations[-1].version if migrations else 0
+    target = latest if target is None else target
+
+    with db.engine.begin() as connection:
+        fresh = not inspect(connection).get_table_names() and target == latest
+        metadata.create_all(connection)
+        current = current_version(connection)
+        if fresh:
+            db.metadata.create_all(connection)
+        elif current == 0:
+            _create_baseline_tables(connection)
+
+    if fresh:
+        # Data hooks (search index tables, rollups) still run once; if one
+        # fails the unstamped schema is upgraded step by step next time
+        for migration in migrations:
+            _after_upgrade(migration)
+        with db.engine.begin() as connection:
+            for migration in migrations:
+                _record(connection, migration)
+        echo(f'Created schema at version {latest}')
+        return latest
+
+    for migration in migrations:
+        if not current < migration.version <= target:
+            continue
+        echo(f'Applying {migration.version:04d}: {migration.description}')
+        with db.engine.begin() as connection:
+            migration.upgrade(connection)
+        _after_upgrade(migration)
+        with db.engine.begin() as connection:
+            _record(connection, migration)
+        current = migration.version
+
+    return current
+
+def check_schema(app):
+    """Compare the database version with the code; never changes the schema"""
+    with app.app_context():
+        with db.engine.connect() as connection:
+            current = current_version(connection)
+    latest = latest_version()
+    if current < latest:
+        logger.warning(
+            "Database schema is at version %d but the code expects %d; run 'flask db upgrade'",
+            current, latest
+        )
+    elif current > latest:
+        logger.warning('Database schema version %d is newer than the code (%d)', current, latest)
+    app.extensions['schema_version'] = current
+    return current
+
+db_cli = AppGroup('db', help='Database schema migrations.')
+
+@db_cli.command('upgrade')
+@click.option('--to', 'target', type=int, help='Stop at this version (default: latest).')
+def upgrade_command(target):
+    """Apply pending schema migrations."""
+    version = upgrade(target, echo=click.echo)
+    click.echo(f'Database is at version {version}')
+
+@db_cli.command('current')
+def current_command():
+    """Show the applied and pending schema versions."""
+    with db.engine.connect() as connection:
+        current = current_version(connection)
+    click.echo(f'Current version: {current}')
+    for migration in load_migrations():
+        if migration.version > current:
+            click.echo(f'Pending {migration.version:04d}: {migration.description}')
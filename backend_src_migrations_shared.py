@@ -0,0 +1,24 @@
+"""Schema steps shared by more than one migration.
+
+Not a migration itself (the runner only loads vNNNN_* modules). Keep
+every step idempotent: each migration that uses one may run it again.
+"""
+from sqlalchemy import text
+
+def create_active_booking_index(connection):
+    """One pending or confirmed booking per service slot (see models/booking.py)"""
+    duplicates = connection.execute(text(
+        "SELECT service_id, booking_date, booking_time, COUNT(*) FROM bookings "
+        "WHERE status IN ('pending', 'confirmed') "
+        "GROUP BY service_id, booking_date, booking_time HAVING COUNT(*) > 1"
+    )).all()
+    if duplicates:
+        # Double bookings need a human decision; refuse rather than cancel one
+        slots = ', '.join(f'service {row[0]} on {row[1]} at {row[2]}' for row in duplicates)
+        raise RuntimeError(f'Resolve double-booked slots before upgrading: {slots}')
+
+    connection.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_bookings_active_slot '
+        'ON bookings (service_id, booking_date, booking_time) '
+        "WHERE status IN ('pending', 'confirmed')"
+    ))
@@ -0,0 +1,65 @@
+"""Secondary indexes for the hot filter columns.
+
+Fresh databases get these from the model declarations; this brings
+existing databases up to the same shape. Every statement is idempotent.
+"""
+from sqlalchemy import inspect, text
+from src.migrations.shared import create_active_booking_index
+
+version = 1
+description = 'Secondary indexes for hot filter columns'
+
+# (name, table, columns, unique) - names match the model declarations
+INDEXES = [
+    ('ix_users_created_at', 'users', ['created_at'], False),
+    ('ix_users_first_name', 'users', ['first_name'], False),
+    ('ix_users_last_name', 'users', ['last_name'], False),
+    ('ix_bookings_service_date', 'bookings', ['service_id', 'booking_date', 'booking_time', 'status'], False),
+    ('ix_bookings_user_date', 'bookings', ['user_id', 'booking_date'], False),
+    ('ix_bookings_date_time', 'bookings', ['booking_date', 'booking_time'], False),
+    ('ix_available_slots_available_date', 'available_slots', ['is_available', 'date'], False),
+    ('ix_course_enrollments_user_course', 'course_enrollments', ['user_id', 'course_id', 'status'], False),
+    ('ix_course_enrollments_course_status', 'course_enrollments', ['course_id', 'status'], False),
+    ('uq_lesson_progress_enrollment_lesson', 'lesson_progress', ['enrollment_id', 'lesson_id'], True),
+    ('ix_subscriptions_user_status_end', 'subscriptions', ['user_id', 'status', 'end_date'], False),
+    ('ix_subscriptions_created_at', 'subscriptions', ['created_at'], False),
+    ('ix_payments_status_date', 'payments', ['status', 'payment_date'], False),
+    ('ix_payments_payment_date', 'payments', ['payment_date'], False),
+    ('ix_payments_user_status', 'payments', ['user_id', 'status'], False),
+    ('ix_payments_related_entity', 'payments', ['related_entity_type', 'related_entity_id'], False),
+    ('ix_newsletter_subscribers_subscribed_at', 'newsletter_subscribers', ['subscribed_at'], False),
+]
+
+def _dedupe_lesson_progress(connection):
+    """Keep one progress row per (enrollment, lesson) before the unique index.
+
+    A completed row wins over an incomplete one, then the newest. Affected
+    enrollments get their completed-lessons counter reset to NULL so it is
+    recounted on next use.
+    """
+    duplicates = connection.execute(text(
+        'SELECT id, enrollment_id FROM ('
+        '  SELECT id, enrollment_id, ROW_NUMBER() OVER ('
+        '    PARTITION BY enrollment_id, lesson_id ORDER BY is_completed DESC, id DESC'
+        '  ) AS position FROM lesson_progress'
+        ') AS ranked WHERE position > 1'
+    )).all()
+    if not duplicates:
+        return
+
+    connection.execute(text('DELETE FROM lesson_progress WHERE id = :id'), [{'id': row.id} for row in duplicates])
+    columns = {column['name'] for column in inspect(connection).get_columns('course_enrollments')}
+    if 'completed_lessons_count' not in columns:
+        return
+    connection.execute(
+        text('UPDATE course_enrollments SET completed_lessons_count = NULL WHERE id = :id'),
+        [{'id': enrollment_id} for enrollment_id in {row.enrollment_id for row in duplicates}]
+    )
+
+def upgrade(connection):
+    _dedupe_lesson_progress(connection)
+    create_active_booking_index(connection)
+    for name, table, columns, unique in INDEXES:
+        connection.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+        ))
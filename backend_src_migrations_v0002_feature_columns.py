@@ -0,0 +1,86 @@
+"""Columns, constraints and tables added since the original schema.
+
+Brings databases created by the old create_all() bootstrap up to date:
+the completed-lessons counter, recurring-slot bounds and exceptions, the
+one-active-booking-per-slot index, the daily metrics rollup tables and the
+search index tables.
+"""
+from sqlalchemy import (
+    Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, UniqueConstraint, inspect, text
+)
+from src.migrations.shared import create_active_booking_index
+
+version = 2
+description = 'Feature columns, active booking index, rollup and search tables'
+
+# Frozen copies of the rollup tables as this migration created them
+metadata = MetaData()
+
+# Only referenced by the foreign key below; never created here
+Table('services', metadata, Column('id', Integer, primary_key=True))
+
+daily_metrics = Table(
+    'daily_metrics', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('date', Date, nullable=False, unique=True),
+    Column('revenue', Float, nullable=False, default=0),
+    Column('payments_count', Integer, nullable=False, default=0),
+    Column('new_users', Integer, nullable=False, default=0),
+    Column('new_bookings', Integer, nullable=False, default=0),
+    Column('new_enrollments', Integer, nullable=False, default=0),
+    Column('updated_at', DateTime)
+)
+
+daily_booking_metrics = Table(
+    'daily_booking_metrics', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('date', Date, nullable=False),
+    Column('service_id', Integer, ForeignKey('services.id'), nullable=False),
+    Column('status', String(50), nullable=False),
+    Column('count', Integer, nullable=False, default=0),
+    UniqueConstraint('date', 'service_id', 'status', name='uq_daily_booking_metrics')
+)
+
+# (table, column, DDL type); existing enrollments keep a NULL counter so
+# the first progress update recounts it
+NEW_COLUMNS = [
+    ('course_enrollments', 'completed_lessons_count', 'INTEGER'),
+    ('available_slots', 'recurring_until', 'DATE'),
+    ('available_slots', 'exception_dates', 'TEXT'),
+]
+
+def _add_missing_columns(connection):
+    inspector = inspect(connection)
+    existing = {}
+    for table, column, ddl_type in NEW_COLUMNS:
+        if table not in existing:
+            existing[table] = {info['name'] for info in inspector.get_columns(table)}
+        if column not in existing[table]:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'))
+            if (table, column) == ('available_slots', 'recurring_until'):
+                _pin_legacy_recurring_slots(connection)
+
+def _pin_legacy_recurring_slots(connection):
+    """Turn slots flagged recurring before recurrences existed into one-off slots.
+
+    The old setup stored one row per concrete date and flagged each one
+    is_recurring/'weekly', but nothing ever repeated them. Expanded as
+    weekly rules with no recurring_until they would repeat forever, so
+    they keep meaning exactly the date they were created for.
+    """
+    connection.execute(text(
+        'UPDATE available_slots SET is_recurring = :false, recurring_pattern = NULL '
+        'WHERE is_recurring = :true'
+    ), {'false': False, 'true': True})
+
+def upgrade(connection):
+    _add_missing_columns(connection)
+    create_active_booking_index(connection)
+    metadata.create_all(connection, tables=[daily_metrics, daily_booking_metrics])
+
+def after_upgrade():
+    from src.services.metrics import backfill
+    from src.services.search import search_index
+
+    backfill()
+    search_index.create_all()
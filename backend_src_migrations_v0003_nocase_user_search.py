@@ -0,0 +1,21 @@
+"""Case-insensitive indexes for the admin user search.
+
+The search compares username, email and names with COLLATE NOCASE on
+SQLite (lower() elsewhere); these expression indexes replace the plain
+first/last name indexes, which such comparisons cannot use.
+"""
+from sqlalchemy import text
+
+version = 3
+description = 'Case-insensitive user search indexes'
+
+COLUMNS = ['username', 'email', 'first_name', 'last_name']
+
+REPLACED_INDEXES = ['ix_users_first_name', 'ix_users_last_name']
+
+def upgrade(connection):
+    for name in REPLACED_INDEXES:
+        connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    for column in COLUMNS:
+        expression = f'{column} COLLATE NOCASE' if connection.dialect.name == 'sqlite' else f'lower({column})'
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS ix_users_{column}_nocase ON users ({expression})'))
@@ -0,0 +1,18 @@
+"""Full-text search index for the PostgreSQL search backend.
+
+PostgreSQL databases used the LIKE-based simple backend until now; the
+new backend keeps its tsvectors in search_vectors, which is created and
+filled here. On SQLite this finds every index already in place.
+"""
+
+version = 4
+description = 'PostgreSQL full-text search index'
+
+def upgrade(connection):
+    # The search backend owns its tables; after_upgrade creates and fills them
+    pass
+
+def after_upgrade():
+    from src.services.search import search_index
+
+    search_index.create_all()
@@ -1,9 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
+from src.db import db
+from sqlalchemy import text
 from datetime import datetime
 import json
 
-db = SQLAlchemy()
-
 class Service(db.Model):
     __tablename__ = 'services'
     
@@ -38,6 +37,20 @@ class Service(db.Model):
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # A slot can hold only one pending or confirmed booking per service;
+        # cancelled and completed bookings release it
+        db.Index(
+            'uq_bookings_active_slot', 'service_id', 'booking_date', 'booking_time',
+            unique=True,
+            sqlite_where=text("status IN ('pending', 'confirmed')"),
+            postgresql_where=text("status IN ('pending', 'confirmed')")
+        ),
+        # Availability lookups: one service over a date range
+        db.Index('ix_bookings_service_date', 'service_id', 'booking_date', 'booking_time', 'status'),
+        db.Index('ix_bookings_user_date', 'user_id', 'booking_date'),
+        db.Index('ix_bookings_date_time', 'booking_date', 'booking_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -78,6 +91,9 @@ class Booking(db.Model):
 
 class AvailableSlot(db.Model):
     __tablename__ = 'available_slots'
+    __table_args__ = (
+        db.Index('ix_available_slots_available_date', 'is_available', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -85,9 +101,19 @@ class AvailableSlot(db.Model):
     end_time = db.Column(db.Time, nullable=False)
     is_available = db.Column(db.Boolean, default=True)
     is_recurring = db.Column(db.Boolean, default=False)
-    recurring_pattern = db.Column(db.String(50))  # weekly, daily, etc.
+    recurring_pattern = db.Column(db.String(50))  # daily, weekly, biweekly
+    recurring_until = db.Column(db.Date)  # last possible occurrence, open-ended if empty
+    exception_dates = db.Column(db.Text)  # JSON list of skipped dates (YYYY-MM-DD)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    def get_exception_dates(self):
+        if not self.exception_dates:
+            return []
+        try:
+            return json.loads(self.exception_dates)
+        except:
+            return []
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -96,6 +122,8 @@ class AvailableSlot(db.Model):
             'end_time': self.end_time.strftime('%H:%M') if self.end_time else None,
             'is_available': self.is_available,
             'is_recurring': self.is_recurring,
-            'recurring_pattern': self.recurring_pattern
+            'recurring_pattern': self.recurring_pattern,
+            'recurring_until': self.recurring_until.isoformat() if self.recurring_until else None,
+            'exception_dates': self.get_exception_dates()
         }
 
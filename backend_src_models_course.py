@@ -1,9 +1,11 @@
-from flask_sqlalchemy import SQLAlchemy
+from src.db import db
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
 from datetime import datetime
+import threading
+import time
 import json
 
-db = SQLAlchemy()
-
 class Course(db.Model):
     __tablename__ = 'courses'
     
@@ -23,10 +25,18 @@ class Course(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    modules = db.relationship('CourseModule', backref='course', lazy=True, cascade='all, delete-orphan')
+    modules = db.relationship('CourseModule', backref='course', lazy=True, cascade='all, delete-orphan',
+                              order_by='CourseModule.order')
     enrollments = db.relationship('CourseEnrollment', backref='course', lazy=True)
     
-    def to_dict(self, language='ar'):
+    def to_dict(self, language='ar', modules_count=None, students_count=None):
+        # Counts can be passed in from an aggregate query to avoid loading
+        # every module and enrollment row just to call len() on them
+        if modules_count is None:
+            modules_count = len(self.modules)
+        if students_count is None:
+            students_count = len(self.enrollments)
+        
         return {
             'id': self.id,
             'title': self.title_ar if language == 'ar' else self.title_en,
@@ -38,8 +48,8 @@ class Course(db.Model):
             'level': self.level,
             'is_published': self.is_published,
             'is_free': self.is_free,
-            'modules_count': len(self.modules),
-            'students_count': len(self.enrollments),
+            'modules_count': modules_count,
+            'students_count': students_count,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -57,19 +67,24 @@ class CourseModule(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    lessons = db.relationship('CourseLesson', backref='module', lazy=True, cascade='all, delete-orphan')
+    lessons = db.relationship('CourseLesson', backref='module', lazy=True, cascade='all, delete-orphan',
+                              order_by='CourseLesson.order')
     
-    def to_dict(self, language='ar'):
-        return {
+    def to_dict(self, language='ar', include_lessons=True):
+        data = {
             'id': self.id,
             'course_id': self.course_id,
             'title': self.title_ar if language == 'ar' else self.title_en,
             'description': self.description_ar if language == 'ar' else self.description_en,
             'order': self.order,
             'is_published': self.is_published,
-            'lessons_count': len(self.lessons),
-            'lessons': [lesson.to_dict(language) for lesson in sorted(self.lessons, key=lambda x: x.order)]
+            'lessons_count': len(self.lessons)
         }
+        
+        if include_lessons:
+            data['lessons'] = [lesson.to_dict(language) for lesson in sorted(self.lessons, key=lambda x: x.order)]
+        
+        return data
 
 class CourseLesson(db.Model):
     __tablename__ = 'course_lessons'
@@ -106,6 +121,10 @@ class CourseLesson(db.Model):
 
 class CourseEnrollment(db.Model):
     __tablename__ = 'course_enrollments'
+    __table_args__ = (
+        db.Index('ix_course_enrollments_user_course', 'user_id', 'course_id', 'status'),
+        db.Index('ix_course_enrollments_course_status', 'course_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -113,6 +132,7 @@ class CourseEnrollment(db.Model):
     enrollment_date = db.Column(db.DateTime, default=datetime.utcnow)
     completion_date = db.Column(db.DateTime)
     progress_percentage = db.Column(db.Float, default=0.0)
+    completed_lessons_count = db.Column(db.Integer, default=0)  # NULL until first recount on legacy rows
     status = db.Column(db.String(50), default='active')  # active, completed, cancelled
     payment_status = db.Column(db.String(50), default='pending')  # pending, paid, failed
     payment_id = db.Column(db.String(100))
@@ -134,6 +154,9 @@ class CourseEnrollment(db.Model):
 
 class LessonProgress(db.Model):
     __tablename__ = 'lesson_progress'
+    __table_args__ = (
+        db.Index('uq_lesson_progress_enrollment_lesson', 'enrollment_id', 'lesson_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     enrollment_id = db.Column(db.Integer, db.ForeignKey('course_enrollments.id'), nullable=False)
@@ -152,3 +175,61 @@ class LessonProgress(db.Model):
             'watch_time_seconds': self.watch_time_seconds
         }
 
+# Published lesson counts per course, used by the progress endpoint so a
+# watch-time heartbeat does not re-count the whole course every time.
+# Commits in this process clear them; the TTL bounds how long another app
+# server's lesson changes can go unnoticed here.
+PUBLISHED_LESSONS_TTL = 60
+
+_published_lessons_counts = {}
+_published_lessons_lock = threading.Lock()
+
+def get_published_lessons_count(course_id):
+    with _published_lessons_lock:
+        entry = _published_lessons_counts.get(course_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+    
+    count = db.session.query(func.count(CourseLesson.id)).join(CourseModule).filter(
+        CourseModule.course_id == course_id,
+        CourseLesson.is_published == True
+    ).scalar() or 0
+    
+    with _published_lessons_lock:
+        _published_lessons_counts[course_id] = (count, time.monotonic() + PUBLISHED_LESSONS_TTL)
+    return count
+
+def invalidate_published_lessons_counts():
+    with _published_lessons_lock:
+        _published_lessons_counts.clear()
+
+def _mark_lessons_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info['published_lessons_changed'] = True
+
+def _mark_lesson_publish_changed(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.is_published.history.has_changes() or state.attrs.module_id.history.has_changes():
+        _mark_lessons_changed(mapper, connection, target)
+
+def _mark_module_course_changed(mapper, connection, target):
+    if inspect(target).attrs.course_id.history.has_changes():
+        _mark_lessons_changed(mapper, connection, target)
+
+event.listen(CourseLesson, 'after_insert', _mark_lessons_changed)
+event.listen(CourseLesson, 'after_delete', _mark_lessons_changed)
+event.listen(CourseLesson, 'after_update', _mark_lesson_publish_changed)
+event.listen(CourseModule, 'after_delete', _mark_lessons_changed)
+event.listen(CourseModule, 'after_update', _mark_module_course_changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_lessons_counts_after_commit(session):
+    # Clear only once the change is visible to other connections, otherwise a
+    # concurrent reader could cache the pre-commit count again
+    if session.info.pop('published_lessons_changed', False):
+        invalidate_published_lessons_counts()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_lessons_counts_flag(session):
+    session.info.pop('published_lessons_changed', None)
@@ -1,9 +1,7 @@
-from flask_sqlalchemy import SQLAlchemy
+from src.db import db
 from datetime import datetime
 import json
 
-db = SQLAlchemy()
-
 class NewsletterSubscriber(db.Model):
     __tablename__ = 'newsletter_subscribers'
     
@@ -14,7 +12,7 @@ class NewsletterSubscriber(db.Model):
     is_subscribed = db.Column(db.Boolean, default=True)
     subscription_source = db.Column(db.String(50))  # website, landing_page, manual
     tags = db.Column(db.Text)  # JSON string of tags
-    subscribed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    subscribed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     unsubscribed_at = db.Column(db.DateTime)
     
     def to_dict(self):
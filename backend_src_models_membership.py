@@ -1,9 +1,7 @@
-from flask_sqlalchemy import SQLAlchemy
+from src.db import db
 from datetime import datetime, timedelta
 import json
 
-db = SQLAlchemy()
-
 class MembershipPlan(db.Model):
     __tablename__ = 'membership_plans'
     
@@ -48,6 +46,10 @@ class MembershipPlan(db.Model):
 
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        db.Index('ix_subscriptions_user_status_end', 'user_id', 'status', 'end_date'),
+        db.Index('ix_subscriptions_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -83,6 +85,12 @@ class Subscription(db.Model):
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_status_date', 'status', 'payment_date'),
+        db.Index('ix_payments_payment_date', 'payment_date'),
+        db.Index('ix_payments_user_status', 'user_id', 'status'),
+        db.Index('ix_payments_related_entity', 'related_entity_type', 'related_entity_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,46 @@
+from src.db import db
+from datetime import datetime
+
+class DailyMetric(db.Model):
+    """Per-day totals maintained incrementally for the admin charts"""
+    __tablename__ = 'daily_metrics'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, unique=True, nullable=False)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)  # completed payments
+    payments_count = db.Column(db.Integer, nullable=False, default=0)
+    new_users = db.Column(db.Integer, nullable=False, default=0)
+    new_bookings = db.Column(db.Integer, nullable=False, default=0)
+    new_enrollments = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'date': self.date.isoformat() if self.date else None,
+            'revenue': self.revenue,
+            'payments_count': self.payments_count,
+            'new_users': self.new_users,
+            'new_bookings': self.new_bookings,
+            'new_enrollments': self.new_enrollments
+        }
+
+class DailyBookingMetric(db.Model):
+    """Bookings created per day, split by service and current status"""
+    __tablename__ = 'daily_booking_metrics'
+    __table_args__ = (
+        db.UniqueConstraint('date', 'service_id', 'status', name='uq_daily_booking_metrics'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'date': self.date.isoformat() if self.date else None,
+            'service_id': self.service_id,
+            'status': self.status,
+            'count': self.count
+        }
@@ -1,10 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
+from src.db import db, nocase
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import json
 
-db = SQLAlchemy()
-
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -26,7 +24,7 @@ class User(db.Model):
     is_verified = db.Column(db.Boolean, default=False)
     email_verified_at = db.Column(db.DateTime)
     last_login = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -97,3 +95,7 @@ class User(db.Model):
         ).filter(
             Subscription.end_date > datetime.utcnow()
         ).first()
+
+# The admin user search compares these case-insensitively by prefix
+for _column in ('username', 'email', 'first_name', 'last_name'):
+    db.Index(f'ix_users_{_column}_nocase', nocase(User.__table__.c[_column]))
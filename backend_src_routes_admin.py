@@ -1,247 +1,264 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User
+from flask import Blueprint, request, jsonify, current_app
+from src.db import db, nocase, pool_metrics, read_pragmas, use_replica
+from src.services.auth import admin_required
+from src.models.user import User
 from src.models.course import Course, CourseEnrollment
 from src.models.booking import Booking, Service
 from src.models.membership import Subscription, Payment, MembershipPlan
 from src.models.marketing import NewsletterSubscriber, EmailCampaign, LandingPage, Coupon
+from src.models.metrics import DailyMetric, DailyBookingMetric
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, case
+from sqlalchemy.orm import joinedload, contains_eager
+from src.services.cache import ResponseCache
+from src.services.metrics import daily_series
+from src.services.pagination import paginate
+from src.services.search import search_filter
+from src.migrations.runner import current_version
 import json
 
 admin_bp = Blueprint('admin', __name__)
 
-def require_admin():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None, jsonify({'error': 'Authentication required'}), 401
+# Always reported by /db/status, whatever the profile sets
+SQLITE_STATUS_PRAGMAS = ['journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store']
+
+# Concurrent admins (and the dashboard auto-refresh) share one computation
+dashboard_cache = ResponseCache(ttl=30)
+
+def count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def sum_if(condition, column):
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+def prefix_match(column, prefix):
+    """Case-insensitive prefix search as a range over the column's NOCASE index"""
+    column, prefix = nocase(column), prefix.lower()
+    return and_(column >= prefix, column < prefix + '\U0010ffff')
+
+def user_search_filter(search):
+    """Indexed lookup for the admin user search box.
+
+    An email address matches exactly; anything else is a prefix of the
+    username, email, first or last name, and "first last" matches both names.
+    """
+    search = search.strip()
+    if '@' in search:
+        return User.email == search.lower()
+    
+    first, _, last = search.partition(' ')
+    if last.strip():
+        return and_(prefix_match(User.first_name, first), prefix_match(User.last_name, last.strip()))
+    
+    return or_(
+        prefix_match(User.username, search),
+        prefix_match(User.email, search),
+        prefix_match(User.first_name, search),
+        prefix_match(User.last_name, search)
+    )
+
+def compute_dashboard_stats():
+    """Dashboard counters with one conditional-aggregate query per table"""
+    # Date range for statistics
+    now = datetime.utcnow()
+    start_date = now - timedelta(days=30)  # Last 30 days
+    
+    # Users statistics
+    users = db.session.query(
+        func.count(User.id).label('total'),
+        count_if(User.created_at >= start_date).label('new_this_month')
+    ).one()
+    
+    active_subscribers = db.session.query(func.count(Subscription.id)).filter(
+        Subscription.status == 'active',
+        Subscription.end_date > now
+    ).scalar()
     
-    user = User.query.get(user_id)
-    if not user:
-        return None, jsonify({'error': 'User not found'}), 404
+    # Revenue statistics
+    revenue = db.session.query(
+        func.coalesce(func.sum(Payment.amount), 0).label('total'),
+        sum_if(Payment.payment_date >= start_date, Payment.amount).label('monthly')
+    ).filter(Payment.status == 'completed').one()
     
-    if user.role != 'admin':
-        return None, jsonify({'error': 'Admin access required'}), 403
+    # Bookings statistics
+    bookings = db.session.query(
+        func.count(Booking.id).label('total'),
+        count_if(Booking.status == 'pending').label('pending'),
+        count_if(Booking.status == 'confirmed').label('confirmed'),
+        count_if(Booking.created_at >= start_date).label('monthly')
+    ).one()
     
-    return user, None, None
+    # Courses statistics
+    courses = db.session.query(
+        func.count(Course.id).label('total'),
+        count_if(Course.is_published == True).label('published')
+    ).one()
+    
+    enrollments = db.session.query(
+        func.count(CourseEnrollment.id).label('total'),
+        count_if(CourseEnrollment.enrollment_date >= start_date).label('monthly')
+    ).one()
+    
+    # Newsletter statistics
+    newsletter = db.session.query(
+        count_if(NewsletterSubscriber.is_subscribed == True).label('subscribed'),
+        count_if(NewsletterSubscriber.subscribed_at >= start_date).label('monthly')
+    ).one()
+    
+    # Top performing courses
+    top_courses = db.session.query(
+        Course.title_ar,
+        Course.title_en,
+        func.count(CourseEnrollment.id).label('enrollment_count')
+    ).join(CourseEnrollment).group_by(Course.id).order_by(
+        func.count(CourseEnrollment.id).desc()
+    ).limit(5).all()
+    
+    # Recent activities, with the users and services they show loaded up front
+    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
+    recent_bookings = Booking.query.options(
+        joinedload(Booking.user),
+        joinedload(Booking.service)
+    ).order_by(Booking.created_at.desc()).limit(5).all()
+    recent_payments = Payment.query.options(
+        joinedload(Payment.user)
+    ).filter_by(status='completed').order_by(
+        Payment.payment_date.desc()
+    ).limit(5).all()
+    
+    return {
+        'overview': {
+            'total_users': users.total,
+            'new_users_this_month': users.new_this_month,
+            'active_subscribers': active_subscribers,
+            'total_revenue': revenue.total,
+            'monthly_revenue': revenue.monthly,
+            'total_bookings': bookings.total,
+            'pending_bookings': bookings.pending,
+            'confirmed_bookings': bookings.confirmed,
+            'monthly_bookings': bookings.monthly,
+            'total_courses': courses.total,
+            'published_courses': courses.published,
+            'total_enrollments': enrollments.total,
+            'monthly_enrollments': enrollments.monthly,
+            'newsletter_subscribers': newsletter.subscribed,
+            'monthly_newsletter_signups': newsletter.monthly
+        },
+        'top_courses': [
+            {
+                'title_ar': course.title_ar,
+                'title_en': course.title_en,
+                'enrollment_count': course.enrollment_count
+            }
+            for course in top_courses
+        ],
+        'recent_activities': {
+            'users': [user.to_dict() for user in recent_users],
+            'bookings': [
+                {
+                    **booking.to_dict(),
+                    'user_name': booking.user.full_name,
+                    'service_name': booking.service.name_ar
+                }
+                for booking in recent_bookings
+            ],
+            'payments': [
+                {
+                    **payment.to_dict(),
+                    'user_name': payment.user.full_name
+                }
+                for payment in recent_payments
+            ]
+        },
+        'generated_at': now.isoformat()
+    }
 
 @admin_bp.route('/dashboard/stats', methods=['GET'])
+@admin_required
+@use_replica
 def get_dashboard_stats():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
-        # Date range for statistics
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)  # Last 30 days
-        
-        # Users statistics
-        total_users = User.query.count()
-        new_users_this_month = User.query.filter(User.created_at >= start_date).count()
-        active_subscribers = Subscription.query.filter(
-            Subscription.status == 'active',
-            Subscription.end_date > datetime.utcnow()
-        ).count()
-        
-        # Revenue statistics
-        total_revenue = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.status == 'completed'
-        ).scalar() or 0
-        
-        monthly_revenue = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.status == 'completed',
-            Payment.payment_date >= start_date
-        ).scalar() or 0
-        
-        # Bookings statistics
-        total_bookings = Booking.query.count()
-        pending_bookings = Booking.query.filter_by(status='pending').count()
-        confirmed_bookings = Booking.query.filter_by(status='confirmed').count()
-        monthly_bookings = Booking.query.filter(Booking.created_at >= start_date).count()
-        
-        # Courses statistics
-        total_courses = Course.query.count()
-        published_courses = Course.query.filter_by(is_published=True).count()
-        total_enrollments = CourseEnrollment.query.count()
-        monthly_enrollments = CourseEnrollment.query.filter(
-            CourseEnrollment.enrollment_date >= start_date
-        ).count()
-        
-        # Newsletter statistics
-        newsletter_subscribers = NewsletterSubscriber.query.filter_by(is_subscribed=True).count()
-        monthly_newsletter_signups = NewsletterSubscriber.query.filter(
-            NewsletterSubscriber.subscribed_at >= start_date
-        ).count()
-        
-        # Top performing courses
-        top_courses = db.session.query(
-            Course.title_ar,
-            Course.title_en,
-            func.count(CourseEnrollment.id).label('enrollment_count')
-        ).join(CourseEnrollment).group_by(Course.id).order_by(
-            func.count(CourseEnrollment.id).desc()
-        ).limit(5).all()
-        
-        # Recent activities
-        recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-        recent_bookings = Booking.query.order_by(Booking.created_at.desc()).limit(5).all()
-        recent_payments = Payment.query.filter_by(status='completed').order_by(
-            Payment.payment_date.desc()
-        ).limit(5).all()
-        
-        stats = {
-            'overview': {
-                'total_users': total_users,
-                'new_users_this_month': new_users_this_month,
-                'active_subscribers': active_subscribers,
-                'total_revenue': total_revenue,
-                'monthly_revenue': monthly_revenue,
-                'total_bookings': total_bookings,
-                'pending_bookings': pending_bookings,
-                'confirmed_bookings': confirmed_bookings,
-                'monthly_bookings': monthly_bookings,
-                'total_courses': total_courses,
-                'published_courses': published_courses,
-                'total_enrollments': total_enrollments,
-                'monthly_enrollments': monthly_enrollments,
-                'newsletter_subscribers': newsletter_subscribers,
-                'monthly_newsletter_signups': monthly_newsletter_signups
-            },
-            'top_courses': [
-                {
-                    'title_ar': course.title_ar,
-                    'title_en': course.title_en,
-                    'enrollment_count': course.enrollment_count
-                }
-                for course in top_courses
-            ],
-            'recent_activities': {
-                'users': [user.to_dict() for user in recent_users],
-                'bookings': [
-                    {
-                        **booking.to_dict(),
-                        'user_name': booking.user.full_name,
-                        'service_name': booking.service.name_ar
-                    }
-                    for booking in recent_bookings
-                ],
-                'payments': [
-                    {
-                        **payment.to_dict(),
-                        'user_name': payment.user.full_name
-                    }
-                    for payment in recent_payments
-                ]
-            }
-        }
+        stats = dashboard_cache.get_or_set('dashboard_stats', compute_dashboard_stats)
         
         return jsonify({'stats': stats}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Chart periods: (days covered, bucket size)
+CHART_PERIODS = {
+    'month': (30, 'day'),
+    'quarter': (90, 'week'),
+    'year': (365, 'month')
+}
+
+def chart_range(default_period='month'):
+    period = request.args.get('period', default_period)
+    days, bucket = CHART_PERIODS.get(period, CHART_PERIODS['year'])
+    bucket = request.args.get('bucket', bucket)
+    if bucket not in ('day', 'week', 'month'):
+        bucket = 'day'
+    end_date = datetime.utcnow().date()
+    return end_date - timedelta(days=days), end_date, bucket
+
 @admin_bp.route('/dashboard/revenue-chart', methods=['GET'])
+@admin_required
+@use_replica
 def get_revenue_chart():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
-        period = request.args.get('period', 'month')  # month, quarter, year
-        
-        if period == 'month':
-            # Last 30 days
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=30)
-            date_format = '%Y-%m-%d'
-        elif period == 'quarter':
-            # Last 3 months
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=90)
-            date_format = '%Y-%m'
-        else:  # year
-            # Last 12 months
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=365)
-            date_format = '%Y-%m'
-        
-        # Get revenue data grouped by date
-        revenue_data = db.session.query(
-            func.date(Payment.payment_date).label('date'),
-            func.sum(Payment.amount).label('revenue')
-        ).filter(
-            Payment.status == 'completed',
-            Payment.payment_date >= start_date,
-            Payment.payment_date <= end_date
-        ).group_by(func.date(Payment.payment_date)).all()
-        
-        # Format data for chart
-        chart_data = []
-        for data in revenue_data:
-            chart_data.append({
-                'date': data.date.strftime(date_format),
-                'revenue': float(data.revenue)
-            })
+        # month -> daily buckets, quarter -> weekly, year -> monthly
+        start_date, end_date, bucket = chart_range()
+        
+        chart_data = daily_series(start_date, end_date, bucket, revenue=DailyMetric.revenue)
         
-        return jsonify({'chart_data': chart_data}), 200
+        return jsonify({'chart_data': chart_data, 'bucket': bucket}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/dashboard/users-chart', methods=['GET'])
+@admin_required
+@use_replica
 def get_users_chart():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
-        # Last 30 days user registrations
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
+        # Last 30 days user registrations by default
+        start_date, end_date, bucket = chart_range()
         
-        users_data = db.session.query(
-            func.date(User.created_at).label('date'),
-            func.count(User.id).label('count')
-        ).filter(
-            User.created_at >= start_date,
-            User.created_at <= end_date
-        ).group_by(func.date(User.created_at)).all()
-        
-        chart_data = []
-        for data in users_data:
-            chart_data.append({
-                'date': data.date.strftime('%Y-%m-%d'),
-                'users': data.count
-            })
+        chart_data = daily_series(start_date, end_date, bucket, users=DailyMetric.new_users)
         
-        return jsonify({'chart_data': chart_data}), 200
+        return jsonify({'chart_data': chart_data, 'bucket': bucket}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/dashboard/bookings-chart', methods=['GET'])
+@admin_required
+@use_replica
 def get_bookings_chart():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
+        # All bookings by default; ?period= limits to bookings created in that window
+        filters = []
+        if request.args.get('period'):
+            start_date, end_date, bucket = chart_range()
+            filters = [DailyBookingMetric.date >= start_date, DailyBookingMetric.date <= end_date]
         
         # Bookings by status
         bookings_by_status = db.session.query(
-            Booking.status,
-            func.count(Booking.id).label('count')
-        ).group_by(Booking.status).all()
+            DailyBookingMetric.status,
+            func.sum(DailyBookingMetric.count).label('count')
+        ).filter(*filters).group_by(DailyBookingMetric.status).all()
         
         # Bookings by service
         bookings_by_service = db.session.query(
             Service.name_ar,
             Service.name_en,
-            func.count(Booking.id).label('count')
-        ).join(Booking).group_by(Service.id).all()
+            func.sum(DailyBookingMetric.count).label('count')
+        ).join(Service, Service.id == DailyBookingMetric.service_id).filter(*filters).group_by(Service.id).all()
         
         status_data = [
             {'status': booking.status, 'count': booking.count}
             for booking in bookings_by_status
+            if booking.count
         ]
         
         service_data = [
@@ -251,6 +268,7 @@ def get_bookings_chart():
                 'count': booking.count
             }
             for booking in bookings_by_service
+            if booking.count
         ]
         
         return jsonify({
@@ -262,29 +280,20 @@ def get_bookings_chart():
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/users', methods=['GET'])
+@admin_required
 def get_all_users():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         search = request.args.get('search', '')
+        q = request.args.get('q', '')
         role_filter = request.args.get('role')
         is_active = request.args.get('is_active')
         
         query = User.query
         
-        if search:
-            query = query.filter(
-                or_(
-                    User.username.contains(search),
-                    User.email.contains(search),
-                    User.first_name.contains(search),
-                    User.last_name.contains(search)
-                )
-            )
+        if search.strip():
+            query = query.filter(user_search_filter(search))
         
         if role_filter:
             query = query.filter_by(role=role_filter)
@@ -292,18 +301,45 @@ def get_all_users():
         if is_active is not None:
             query = query.filter_by(is_active=is_active.lower() == 'true')
         
-        users = query.order_by(User.created_at.desc()).paginate(
+        # Full-text matches come back ranked; otherwise newest first
+        if q.strip():
+            query = search_filter(query, 'users', User, q)
+        else:
+            query = query.order_by(User.created_at.desc())
+        
+        users = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
         
+        # Per-user aggregates for the whole page in one grouped query each
+        user_ids = [user_item.id for user_item in users.items]
+        bookings_count = {}
+        payments_total = {}
+        subscribed = set()
+        if user_ids:
+            bookings_count = dict(db.session.query(
+                Booking.user_id, func.count(Booking.id)
+            ).filter(Booking.user_id.in_(user_ids)).group_by(Booking.user_id).all())
+            
+            payments_total = dict(db.session.query(
+                Payment.user_id, func.sum(Payment.amount)
+            ).filter(
+                Payment.user_id.in_(user_ids),
+                Payment.status == 'completed'
+            ).group_by(Payment.user_id).all())
+            
+            subscribed = {row.user_id for row in db.session.query(Subscription.user_id).filter(
+                Subscription.user_id.in_(user_ids),
+                Subscription.status == 'active',
+                Subscription.end_date > datetime.utcnow()
+            ).distinct()}
+        
         users_data = []
         for user_item in users.items:
             user_dict = user_item.to_dict()
-            user_dict['has_active_subscription'] = user_item.has_active_subscription
-            user_dict['total_bookings'] = Booking.query.filter_by(user_id=user_item.id).count()
-            user_dict['total_payments'] = db.session.query(func.sum(Payment.amount)).filter_by(
-                user_id=user_item.id, status='completed'
-            ).scalar() or 0
+            user_dict['has_active_subscription'] = user_item.id in subscribed
+            user_dict['total_bookings'] = bookings_count.get(user_item.id, 0)
+            user_dict['total_payments'] = payments_total.get(user_item.id) or 0
             users_data.append(user_dict)
         
         return jsonify({
@@ -322,12 +358,9 @@ def get_all_users():
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/users/<int:user_id>', methods=['PUT'])
+@admin_required
 def update_user(user_id):
     try:
-        admin_user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         user = User.query.get_or_404(user_id)
         data = request.get_json()
         
@@ -354,12 +387,10 @@ def update_user(user_id):
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/reports/revenue', methods=['GET'])
+@admin_required
+@use_replica
 def get_revenue_report():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         payment_method = request.args.get('payment_method')
@@ -383,29 +414,33 @@ def get_revenue_report():
         if payment_method:
             query = query.filter_by(payment_method=payment_method)
         
-        payments = query.order_by(Payment.payment_date.desc()).all()
-        
-        # Calculate totals
-        total_amount = sum(payment.amount for payment in payments)
-        payment_count = len(payments)
+        # Summaries are grouped in SQL; only the requested page of rows is loaded
+        groups = query.with_entities(
+            Payment.payment_method,
+            Payment.payment_type,
+            func.count(Payment.id),
+            func.coalesce(func.sum(Payment.amount), 0)
+        ).group_by(Payment.payment_method, Payment.payment_type).all()
         
-        # Group by payment method
+        total_amount = 0
+        payment_count = 0
         by_method = {}
-        for payment in payments:
-            method = payment.payment_method
-            if method not in by_method:
-                by_method[method] = {'count': 0, 'amount': 0}
-            by_method[method]['count'] += 1
-            by_method[method]['amount'] += payment.amount
-        
-        # Group by payment type
         by_type = {}
-        for payment in payments:
-            ptype = payment.payment_type
-            if ptype not in by_type:
-                by_type[ptype] = {'count': 0, 'amount': 0}
-            by_type[ptype]['count'] += 1
-            by_type[ptype]['amount'] += payment.amount
+        for method, ptype, count, amount in groups:
+            total_amount += amount
+            payment_count += count
+            for totals, key in ((by_method, method), (by_type, ptype)):
+                entry = totals.setdefault(key, {'count': 0, 'amount': 0})
+                entry['count'] += count
+                entry['amount'] += amount
+        
+        try:
+            payments, pagination = paginate(
+                query.join(Payment.user).options(contains_eager(Payment.user)),
+                [Payment.payment_date, Payment.id]
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         payments_data = []
         for payment in payments:
@@ -415,6 +450,7 @@ def get_revenue_report():
         
         return jsonify({
             'payments': payments_data,
+            'pagination': pagination,
             'summary': {
                 'total_amount': total_amount,
                 'payment_count': payment_count,
@@ -427,34 +463,49 @@ def get_revenue_report():
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/reports/courses', methods=['GET'])
+@admin_required
+@use_replica
 def get_courses_report():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
+        # Enrollment and revenue totals are aggregated per course in
+        # subqueries, so the report is one query however many courses exist
+        enrollment_stats = db.session.query(
+            CourseEnrollment.course_id.label('course_id'),
+            func.count(CourseEnrollment.id).label('enrollment_count'),
+            func.avg(CourseEnrollment.progress_percentage).label('avg_progress'),
+            count_if(CourseEnrollment.status == 'active').label('active_count'),
+            count_if(CourseEnrollment.status == 'completed').label('completed_count')
+        ).group_by(CourseEnrollment.course_id).subquery()
+        
+        revenue_stats = db.session.query(
+            CourseEnrollment.course_id.label('course_id'),
+            func.sum(Payment.amount).label('revenue')
+        ).join(
+            CourseEnrollment, Payment.related_entity_id == CourseEnrollment.id
+        ).filter(
+            Payment.related_entity_type == 'course_enrollment',
+            Payment.status == 'completed'
+        ).group_by(CourseEnrollment.course_id).subquery()
         
-        # Course performance data
         courses_data = db.session.query(
             Course.id,
             Course.title_ar,
             Course.title_en,
             Course.price,
             Course.is_published,
-            func.count(CourseEnrollment.id).label('enrollment_count'),
-            func.avg(CourseEnrollment.progress_percentage).label('avg_progress')
-        ).outerjoin(CourseEnrollment).group_by(Course.id).all()
+            func.coalesce(enrollment_stats.c.enrollment_count, 0).label('enrollment_count'),
+            enrollment_stats.c.avg_progress,
+            func.coalesce(enrollment_stats.c.active_count, 0).label('active_count'),
+            func.coalesce(enrollment_stats.c.completed_count, 0).label('completed_count'),
+            func.coalesce(revenue_stats.c.revenue, 0).label('revenue')
+        ).outerjoin(
+            enrollment_stats, enrollment_stats.c.course_id == Course.id
+        ).outerjoin(
+            revenue_stats, revenue_stats.c.course_id == Course.id
+        ).order_by(Course.id).all()
         
         courses_report = []
         for course in courses_data:
-            # Calculate revenue for this course
-            course_revenue = db.session.query(func.sum(Payment.amount)).join(
-                CourseEnrollment, Payment.related_entity_id == CourseEnrollment.id
-            ).filter(
-                CourseEnrollment.course_id == course.id,
-                Payment.related_entity_type == 'course_enrollment',
-                Payment.status == 'completed'
-            ).scalar() or 0
-            
             courses_report.append({
                 'id': course.id,
                 'title_ar': course.title_ar,
@@ -462,8 +513,11 @@ def get_courses_report():
                 'price': course.price,
                 'is_published': course.is_published,
                 'enrollment_count': course.enrollment_count,
+                'active_count': course.active_count,
+                'completed_count': course.completed_count,
+                'completion_rate': round(course.completed_count * 100.0 / course.enrollment_count, 2) if course.enrollment_count else 0,
                 'avg_progress': float(course.avg_progress) if course.avg_progress else 0,
-                'revenue': float(course_revenue)
+                'revenue': float(course.revenue)
             })
         
         return jsonify({'courses': courses_report}), 200
@@ -472,12 +526,10 @@ def get_courses_report():
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/reports/marketing', methods=['GET'])
+@admin_required
+@use_replica
 def get_marketing_report():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         # Newsletter statistics
         total_subscribers = NewsletterSubscriber.query.filter_by(is_subscribed=True).count()
         unsubscribed = NewsletterSubscriber.query.filter_by(is_subscribed=False).count()
@@ -537,3 +589,36 @@ def get_marketing_report():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@admin_bp.route('/db/status', methods=['GET'])
+@admin_required
+def get_db_status():
+    try:
+        engine = db.engine
+        status = {
+            'dialect': engine.dialect.name,
+            'schema_version': current_version(db.session.connection()),
+            'pool': engine.pool.status(),
+            'engines': pool_metrics(current_app)
+        }
+        
+        replica = current_app.extensions.get('db_replica')
+        if replica is not None:
+            status['replica'] = {
+                'available': replica.available,
+                'sticky_seconds': replica.sticky_seconds
+            }
+        
+        if engine.dialect.name == 'sqlite':
+            configured = current_app.extensions.get('sqlite_pragmas', {})
+            status['pragma_profile'] = current_app.config.get('SQLITE_PRAGMA_PROFILE', 'production')
+            status['configured_pragmas'] = configured
+            # Read back from a pooled connection: what requests actually run with
+            status['active_pragmas'] = read_pragmas(
+                db.session.connection(), sorted(set(SQLITE_STATUS_PRAGMAS) | set(configured))
+            )
+        
+        return jsonify(status), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
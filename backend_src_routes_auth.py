@@ -1,5 +1,8 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User
+from flask import Blueprint, request, jsonify, session, g
+from src.db import db
+from src.services.auth import login_required
+from src.models.user import User
+from src.services.metrics import record_user_registered
 from datetime import datetime
 import re
 
@@ -64,6 +67,7 @@ def register():
         user.set_password(password)
         
         db.session.add(user)
+        record_user_registered(user)
         db.session.commit()
         
         # Log the user in
@@ -126,16 +130,10 @@ def logout():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
+@login_required
 def get_current_user():
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'error': 'Not authenticated'}), 401
-        
-        user = User.query.get(user_id)
-        if not user:
-            session.clear()
-            return jsonify({'error': 'User not found'}), 404
+        user = g.user
         
         return jsonify({
             'user': user.to_dict(include_sensitive=True),
@@ -146,15 +144,10 @@ def get_current_user():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/profile', methods=['PUT'])
+@login_required
 def update_profile():
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'error': 'Not authenticated'}), 401
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        user = g.user
         
         data = request.get_json()
         
@@ -188,15 +181,10 @@ def update_profile():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/change-password', methods=['PUT'])
+@login_required
 def change_password():
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'error': 'Not authenticated'}), 401
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        user = g.user
         
         data = request.get_json()
         
@@ -1,33 +1,23 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User
+from flask import Blueprint, request, jsonify, g
+from src.db import db, use_replica
+from src.services.auth import login_required, admin_required
 from src.models.booking import Service, Booking, AvailableSlot
-from datetime import datetime, date, time, timedelta
+from src.services.availability import (
+    availability_calendar, format_sessions, load_slot_intervals, overlaps, to_minutes, RECURRENCE_STEPS
+)
+from src.services.metrics import record_booking_created, record_booking_status_change
+from src.services.pagination import paginate
+from src.services.export import export_response
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, contains_eager
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date, timedelta
 import json
 
 booking_bp = Blueprint('booking', __name__)
 
-def require_auth():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None, jsonify({'error': 'Authentication required'}), 401
-    
-    user = User.query.get(user_id)
-    if not user:
-        return None, jsonify({'error': 'User not found'}), 404
-    
-    return user, None, None
-
-def require_admin():
-    user, error_response, status_code = require_auth()
-    if error_response:
-        return user, error_response, status_code
-    
-    if user.role != 'admin':
-        return None, jsonify({'error': 'Admin access required'}), 403
-    
-    return user, None, None
-
 @booking_bp.route('/services', methods=['GET'])
+@use_replica
 def get_services():
     try:
         language = request.args.get('language', 'ar')
@@ -41,6 +31,7 @@ def get_services():
         return jsonify({'error': str(e)}), 500
 
 @booking_bp.route('/services/<int:service_id>', methods=['GET'])
+@use_replica
 def get_service(service_id):
     try:
         language = request.args.get('language', 'ar')
@@ -81,84 +72,19 @@ def get_available_slots():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
         
-        # Get available slots
-        available_slots = AvailableSlot.query.filter(
-            AvailableSlot.date >= start_date,
-            AvailableSlot.date <= end_date,
-            AvailableSlot.is_available == True
-        ).all()
-        
-        # Get existing bookings to exclude booked slots
-        existing_bookings = Booking.query.filter(
-            Booking.service_id == service_id,
-            Booking.booking_date >= start_date,
-            Booking.booking_date <= end_date,
-            Booking.status.in_(['pending', 'confirmed'])
-        ).all()
-        
-        # Create a set of booked slots for quick lookup
-        booked_slots = set()
-        for booking in existing_bookings:
-            slot_key = f"{booking.booking_date}_{booking.booking_time}"
-            booked_slots.add(slot_key)
-        
-        # Filter available slots
-        available_times = []
-        for slot in available_slots:
-            slot_key = f"{slot.date}_{slot.start_time}"
-            if slot_key not in booked_slots:
-                available_times.append({
-                    'date': slot.date.isoformat(),
-                    'start_time': slot.start_time.strftime('%H:%M'),
-                    'end_time': slot.end_time.strftime('%H:%M'),
-                    'duration_minutes': service.duration_minutes
-                })
-        
-        # If no predefined slots, generate default slots
-        if not available_times:
-            available_times = generate_default_slots(start_date, end_date, service, booked_slots)
+        sessions = availability_calendar.get_sessions(service, start_date, end_date)
+        available_times = format_sessions(sessions, service.duration_minutes)
         
         return jsonify({'available_slots': available_times}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def generate_default_slots(start_date, end_date, service, booked_slots):
-    """Generate default available slots if none are predefined"""
-    default_times = [
-        time(9, 0), time(10, 30), time(12, 0), 
-        time(13, 30), time(15, 0), time(16, 30), time(18, 0)
-    ]
-    
-    available_times = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        # Skip weekends for default slots
-        if current_date.weekday() < 5:  # Monday = 0, Sunday = 6
-            for slot_time in default_times:
-                slot_key = f"{current_date}_{slot_time}"
-                if slot_key not in booked_slots:
-                    end_time = (datetime.combine(current_date, slot_time) + 
-                              timedelta(minutes=service.duration_minutes)).time()
-                    
-                    available_times.append({
-                        'date': current_date.isoformat(),
-                        'start_time': slot_time.strftime('%H:%M'),
-                        'end_time': end_time.strftime('%H:%M'),
-                        'duration_minutes': service.duration_minutes
-                    })
-        
-        current_date += timedelta(days=1)
-    
-    return available_times
-
 @booking_bp.route('/bookings', methods=['POST'])
+@login_required
 def create_booking():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         data = request.get_json()
         
@@ -188,18 +114,8 @@ def create_booking():
         if booking_date <= date.today():
             return jsonify({'error': 'Booking date must be in the future'}), 400
         
-        # Check if slot is available
-        existing_booking = Booking.query.filter_by(
-            service_id=service_id,
-            booking_date=booking_date,
-            booking_time=booking_time,
-            status='confirmed'
-        ).first()
-        
-        if existing_booking:
-            return jsonify({'error': 'This time slot is already booked'}), 400
-        
-        # Create booking
+        # Create booking; the uq_bookings_active_slot index rejects a slot that
+        # already has a pending or confirmed booking, so there is no pre-check
         booking = Booking(
             user_id=user.id,
             service_id=service_id,
@@ -214,7 +130,14 @@ def create_booking():
         )
         
         db.session.add(booking)
-        db.session.commit()
+        try:
+            db.session.flush()
+            record_booking_created(booking)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'This time slot is already booked'}), 409
+        availability_calendar.invalidate(booking.booking_date, booking.service_id)
         
         # TODO: Send confirmation email
         # TODO: Create payment intent for payment processing
@@ -229,11 +152,10 @@ def create_booking():
         return jsonify({'error': str(e)}), 500
 
 @booking_bp.route('/bookings/<int:booking_id>/confirm', methods=['POST'])
+@login_required
 def confirm_booking(booking_id):
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         booking = Booking.query.get_or_404(booking_id)
         
@@ -249,6 +171,7 @@ def confirm_booking(booking_id):
             return jsonify({'error': 'Payment information required'}), 400
         
         # Update booking status
+        old_status = booking.status
         booking.status = 'confirmed'
         booking.payment_status = 'paid'
         booking.payment_id = payment_id
@@ -260,7 +183,9 @@ def confirm_booking(booking_id):
             booking.meeting_link = generate_meeting_link(booking)
             booking.meeting_id = f"meeting_{booking.id}_{datetime.utcnow().strftime('%Y%m%d%H%M')}"
         
+        record_booking_status_change(booking, old_status)
         db.session.commit()
+        availability_calendar.invalidate(booking.booking_date, booking.service_id)
         
         # TODO: Send confirmation email with meeting details
         
@@ -281,11 +206,10 @@ def generate_meeting_link(booking):
     return f"{base_url}{meeting_id}"
 
 @booking_bp.route('/my-bookings', methods=['GET'])
+@login_required
 def get_my_bookings():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         status_filter = request.args.get('status')
         
@@ -308,11 +232,10 @@ def get_my_bookings():
         return jsonify({'error': str(e)}), 500
 
 @booking_bp.route('/bookings/<int:booking_id>/cancel', methods=['POST'])
+@login_required
 def cancel_booking(booking_id):
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         booking = Booking.query.get_or_404(booking_id)
         
@@ -325,12 +248,15 @@ def cancel_booking(booking_id):
         if booking_datetime <= datetime.now() + timedelta(hours=24):
             return jsonify({'error': 'Cannot cancel booking less than 24 hours before appointment'}), 400
         
+        old_status = booking.status
         booking.status = 'cancelled'
         booking.updated_at = datetime.utcnow()
         
         # TODO: Process refund if payment was made
         
+        record_booking_status_change(booking, old_status)
         db.session.commit()
+        availability_calendar.invalidate(booking.booking_date, booking.service_id)
         
         return jsonify({
             'message': 'Booking cancelled successfully',
@@ -343,12 +269,9 @@ def cancel_booking(booking_id):
 
 # Admin routes
 @booking_bp.route('/admin/services', methods=['POST'])
+@admin_required
 def create_service():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         required_fields = ['name_ar', 'name_en', 'price']
@@ -380,37 +303,43 @@ def create_service():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def filter_bookings(query, args):
+    """Apply the admin booking list filters; raises ValueError for bad dates"""
+    status_filter = args.get('status')
+    date_from = args.get('date_from')
+    date_to = args.get('date_to')
+    
+    if status_filter:
+        query = query.filter(Booking.status == status_filter)
+    
+    if date_from:
+        try:
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Invalid date_from format')
+        query = query.filter(Booking.booking_date >= date_from)
+    
+    if date_to:
+        try:
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Invalid date_to format')
+        query = query.filter(Booking.booking_date <= date_to)
+    
+    return query
+
 @booking_bp.route('/admin/bookings', methods=['GET'])
+@admin_required
 def get_all_bookings():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
-        status_filter = request.args.get('status')
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        
-        query = Booking.query
-        
-        if status_filter:
-            query = query.filter_by(status=status_filter)
-        
-        if date_from:
-            try:
-                date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-                query = query.filter(Booking.booking_date >= date_from)
-            except ValueError:
-                return jsonify({'error': 'Invalid date_from format'}), 400
-        
-        if date_to:
-            try:
-                date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                query = query.filter(Booking.booking_date <= date_to)
-            except ValueError:
-                return jsonify({'error': 'Invalid date_to format'}), 400
-        
-        bookings = query.order_by(Booking.booking_date.desc(), Booking.booking_time.desc()).all()
+        try:
+            query = filter_bookings(Booking.query, request.args)
+            bookings, pagination = paginate(
+                query.options(joinedload(Booking.service), joinedload(Booking.user)),
+                [Booking.booking_date, Booking.booking_time, Booking.id]
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         bookings_data = []
         for booking in bookings:
@@ -419,18 +348,54 @@ def get_all_bookings():
             booking_dict['user'] = booking.user.to_dict()
             bookings_data.append(booking_dict)
         
-        return jsonify({'bookings': bookings_data}), 200
+        return jsonify({'bookings': bookings_data, 'pagination': pagination}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+BOOKING_EXPORT_FIELDS = [
+    'id', 'booking_date', 'booking_time', 'duration_minutes', 'status', 'payment_status',
+    'price', 'currency', 'service_ar', 'service_en', 'user_id', 'user_name', 'user_email', 'created_at'
+]
+
+def booking_export_row(booking):
+    return {
+        'id': booking.id,
+        'booking_date': booking.booking_date,
+        'booking_time': booking.booking_time,
+        'duration_minutes': booking.duration_minutes,
+        'status': booking.status,
+        'payment_status': booking.payment_status,
+        'price': booking.price,
+        'currency': booking.currency,
+        'service_ar': booking.service.name_ar,
+        'service_en': booking.service.name_en,
+        'user_id': booking.user_id,
+        'user_name': booking.user.full_name,
+        'user_email': booking.user.email,
+        'created_at': booking.created_at
+    }
+
+@booking_bp.route('/admin/bookings/export', methods=['GET'])
+@admin_required
+@use_replica
+def export_bookings():
+    try:
+        try:
+            query = filter_bookings(Booking.query, request.args).join(Booking.service).join(Booking.user).options(
+                contains_eager(Booking.service), contains_eager(Booking.user)
+            ).order_by(Booking.id)
+            return export_response(query, BOOKING_EXPORT_FIELDS, booking_export_row, 'bookings')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @booking_bp.route('/admin/available-slots', methods=['POST'])
+@admin_required
 def create_available_slot():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         required_fields = ['date', 'start_time', 'end_time']
@@ -442,20 +407,38 @@ def create_available_slot():
             slot_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
             start_time = datetime.strptime(data['start_time'], '%H:%M').time()
             end_time = datetime.strptime(data['end_time'], '%H:%M').time()
+            recurring_until = datetime.strptime(data['recurring_until'], '%Y-%m-%d').date() if data.get('recurring_until') else None
+            exception_dates = sorted({
+                datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+                for value in data.get('exception_dates', [])
+            })
         except ValueError:
             return jsonify({'error': 'Invalid date or time format'}), 400
         
+        is_recurring = bool(data.get('is_recurring', False))
+        if is_recurring and data.get('recurring_pattern') not in RECURRENCE_STEPS:
+            return jsonify({'error': f"recurring_pattern must be one of: {', '.join(RECURRENCE_STEPS)}"}), 400
+        
+        # A recurring slot is stored once and expanded when availability is read
         slot = AvailableSlot(
             date=slot_date,
             start_time=start_time,
             end_time=end_time,
-            is_recurring=data.get('is_recurring', False),
-            recurring_pattern=data.get('recurring_pattern')
+            is_recurring=is_recurring,
+            recurring_pattern=data.get('recurring_pattern'),
+            recurring_until=recurring_until,
+            exception_dates=json.dumps(exception_dates) if exception_dates else None
         )
         
         db.session.add(slot)
         db.session.commit()
         
+        # Slots are shared by every service
+        if slot.is_recurring:
+            availability_calendar.invalidate_all()
+        else:
+            availability_calendar.invalidate(slot.date)
+        
         return jsonify({
             'message': 'Available slot created successfully',
             'slot': slot.to_dict()
@@ -465,3 +448,225 @@ def create_available_slot():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+MAX_BULK_SLOTS = 1000
+
+def expand_slot_template(template):
+    """Turn a date-range template into one slot entry per matching day and time"""
+    start_date = datetime.strptime(template['start_date'], '%Y-%m-%d').date()
+    end_date = datetime.strptime(template['end_date'], '%Y-%m-%d').date()
+    weekdays = set(template.get('weekdays', range(7)))  # Monday = 0, Sunday = 6
+    
+    if end_date < start_date or (end_date - start_date).days > 366:
+        raise ValueError('Template range must be between 1 and 367 days')
+    
+    entries = []
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date.weekday() in weekdays:
+            for slot_time in template.get('times', []):
+                if not isinstance(slot_time, dict):
+                    # Kept as is so the bulk endpoint reports it as a failed row
+                    entries.append(slot_time)
+                    continue
+                entries.append({
+                    'date': current_date.isoformat(),
+                    'start_time': slot_time.get('start_time'),
+                    'end_time': slot_time.get('end_time')
+                })
+        current_date += timedelta(days=1)
+    return entries
+
+@booking_bp.route('/admin/available-slots/bulk', methods=['POST'])
+@admin_required
+def create_available_slots_bulk():
+    """Create many one-off slots in one transaction.
+
+    Accepts either {"slots": [{date, start_time, end_time}, ...]} or
+    {"template": {start_date, end_date, weekdays, times: [{start_time, end_time}]}}.
+    Every entry is validated and checked for overlaps against existing
+    slots (one query) and the rest of the batch; valid entries are inserted
+    with a single executemany. With all_or_nothing=true nothing is inserted
+    if any entry fails.
+    """
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        all_or_nothing = bool(data.get('all_or_nothing', False))
+        
+        if data.get('template'):
+            try:
+                entries = expand_slot_template(data['template'])
+            except (KeyError, TypeError, ValueError) as e:
+                return jsonify({'error': f'Invalid template: {e}'}), 400
+        else:
+            entries = data.get('slots') or []
+        
+        if not entries:
+            return jsonify({'error': 'slots or template is required'}), 400
+        
+        if not isinstance(entries, list):
+            return jsonify({'error': 'slots must be a list'}), 400
+        
+        if len(entries) > MAX_BULK_SLOTS:
+            return jsonify({'error': f'At most {MAX_BULK_SLOTS} slots per request'}), 400
+        
+        # Parse and validate every entry before touching the database
+        results = []
+        parsed = []
+        for index, entry in enumerate(entries):
+            try:
+                if not isinstance(entry, dict):
+                    raise TypeError('Each slot must be an object')
+                if entry.get('is_recurring'):
+                    raise ValueError('Recurring slots must be created one at a time')
+                slot_date = datetime.strptime(entry['date'], '%Y-%m-%d').date()
+                start_time = datetime.strptime(entry['start_time'], '%H:%M').time()
+                end_time = datetime.strptime(entry['end_time'], '%H:%M').time()
+                if end_time <= start_time:
+                    raise ValueError('end_time must be after start_time')
+            except (KeyError, TypeError, ValueError) as e:
+                message = f'{e.args[0]} is required' if isinstance(e, KeyError) else str(e)
+                results.append({'index': index, 'status': 'error', 'error': message})
+                continue
+            
+            results.append({'index': index, 'status': 'valid'})
+            parsed.append((index, slot_date, start_time, end_time))
+        
+        # Overlaps against stored slots (one query) and earlier batch entries
+        if parsed:
+            taken = load_slot_intervals(min(p[1] for p in parsed), max(p[1] for p in parsed))
+            accepted = {}  # date -> [(start, end, index)] of valid batch entries
+            for index, slot_date, start_time, end_time in parsed:
+                start, end = to_minutes(start_time), to_minutes(end_time)
+                if overlaps(taken.get(slot_date, []), start, end):
+                    results[index] = {'index': index, 'status': 'error', 'error': 'Overlaps an existing slot'}
+                    continue
+                day_entries = accepted.setdefault(slot_date, [])
+                conflict = next((other for other_start, other_end, other in day_entries
+                                 if other_start < end and start < other_end), None)
+                if conflict is not None:
+                    results[index] = {'index': index, 'status': 'error', 'error': f'Overlaps slot {conflict} in this request'}
+                else:
+                    day_entries.append((start, end, index))
+        
+        rows = [
+            {
+                'date': slot_date,
+                'start_time': start_time,
+                'end_time': end_time,
+                'is_available': True,
+                'is_recurring': False
+            }
+            for index, slot_date, start_time, end_time in parsed
+            if results[index]['status'] == 'valid'
+        ]
+        failed = len(entries) - len(rows)
+        
+        if failed and (all_or_nothing or not rows):
+            return jsonify({
+                'error': 'No slots were created',
+                'created': 0,
+                'failed': failed,
+                'results': results
+            }), 400
+        
+        # Valid rows never share a (date, start_time), so RETURNING rows can be
+        # matched back by that pair whatever order the database uses
+        inserted = db.session.execute(
+            insert(AvailableSlot).returning(AvailableSlot.id, AvailableSlot.date, AvailableSlot.start_time),
+            rows
+        ).all()
+        db.session.commit()
+        slot_ids = {(row.date, row.start_time): row.id for row in inserted}
+        
+        valid_results = (result for result in results if result['status'] == 'valid')
+        for result, row in zip(valid_results, rows):
+            result.update({
+                'status': 'created',
+                'slot': {
+                    'id': slot_ids.get((row['date'], row['start_time'])),
+                    'date': row['date'].isoformat(),
+                    'start_time': row['start_time'].strftime('%H:%M'),
+                    'end_time': row['end_time'].strftime('%H:%M')
+                }
+            })
+        
+        for day in {row['date'] for row in rows}:
+            availability_calendar.invalidate(day)
+        
+        return jsonify({
+            'message': 'Available slots created successfully',
+            'created': len(rows),
+            'failed': failed,
+            'results': results
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@booking_bp.route('/admin/available-slots/<int:slot_id>/exceptions', methods=['POST'])
+@admin_required
+def add_slot_exceptions(slot_id):
+    """Skip a recurring slot on specific dates"""
+    try:
+        slot = AvailableSlot.query.get_or_404(slot_id)
+        data = request.get_json()
+        
+        if not slot.is_recurring:
+            return jsonify({'error': 'Only recurring slots have exception dates'}), 400
+        
+        if not data.get('dates'):
+            return jsonify({'error': 'dates is required'}), 400
+        
+        try:
+            new_dates = {datetime.strptime(value, '%Y-%m-%d').date() for value in data['dates']}
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        exception_dates = set(slot.get_exception_dates()) | {day.isoformat() for day in new_dates}
+        slot.exception_dates = json.dumps(sorted(exception_dates))
+        db.session.commit()
+        
+        for day in new_dates:
+            availability_calendar.invalidate(day)
+        
+        return jsonify({
+            'message': 'Exception dates added successfully',
+            'slot': slot.to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@booking_bp.route('/admin/availability/check', methods=['GET'])
+@admin_required
+def check_availability_calendar():
+    """Compare the materialized availability calendar with the live tables"""
+    try:
+        service_id = request.args.get('service_id', type=int)
+        repair = request.args.get('repair', 'false').lower() == 'true'
+        
+        if not service_id:
+            return jsonify({'error': 'service_id is required'}), 400
+        
+        service = Service.query.get_or_404(service_id)
+        
+        try:
+            start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else date.today()
+            end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else start_date + timedelta(days=14)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        mismatches = availability_calendar.check(service, start_date, end_date, repair=repair)
+        
+        return jsonify({
+            'consistent': not mismatches,
+            'mismatches': mismatches,
+            'repaired': repair
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,159 +1,295 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User
-from src.models.course import Course, CourseModule, CourseLesson, CourseEnrollment, LessonProgress
+from flask import Blueprint, request, jsonify, g, current_app
+from src.db import db, read_from_primary, use_replica
+from src.services.auth import login_required, admin_required
+from src.models.course import Course, CourseModule, CourseLesson, CourseEnrollment, LessonProgress, get_published_lessons_count
 from src.models.membership import Subscription
+from src.services.progress_buffer import watch_time_buffer
+from src.services.cache import catalog_cache, invalidate_catalog
+from src.services.metrics import record_enrollment
+from src.services.search import search_filter
 from datetime import datetime
+import json
+from sqlalchemy import case, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 courses_bp = Blueprint('courses', __name__)
 
-def require_auth():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None, jsonify({'error': 'Authentication required'}), 401
+def course_catalog_query():
+    """Query yielding (course, modules_count, students_count) rows.
+
+    The counts come from grouped subqueries so listing N courses costs one
+    query instead of lazy-loading every module and enrollment per course.
+    """
+    modules_count = db.session.query(
+        CourseModule.course_id,
+        func.count(CourseModule.id).label('modules_count')
+    ).group_by(CourseModule.course_id).subquery()
+    
+    students_count = db.session.query(
+        CourseEnrollment.course_id,
+        func.count(CourseEnrollment.id).label('students_count')
+    ).group_by(CourseEnrollment.course_id).subquery()
+    
+    return db.session.query(
+        Course,
+        func.coalesce(modules_count.c.modules_count, 0),
+        func.coalesce(students_count.c.students_count, 0)
+    ).outerjoin(
+        modules_count, modules_count.c.course_id == Course.id
+    ).outerjoin(
+        students_count, students_count.c.course_id == Course.id
+    )
+
+def get_active_enrollments(user_id):
+    """Map course_id -> progress_percentage for the user's active enrollments"""
+    rows = db.session.query(
+        CourseEnrollment.course_id,
+        CourseEnrollment.progress_percentage
+    ).filter_by(user_id=user_id, status='active').all()
+    return {row.course_id: row.progress_percentage for row in rows}
+
+def build_catalog_payload(language, published_only=True):
+    rows = course_catalog_query()
+    if published_only:
+        rows = rows.filter(Course.is_published == True)
     
-    user = User.query.get(user_id)
-    if not user:
-        return None, jsonify({'error': 'User not found'}), 404
+    courses_data = []
+    for course, modules_count, students_count in rows.order_by(Course.id).all():
+        course_dict = course.to_dict(language, modules_count, students_count)
+        course_dict['is_enrolled'] = False
+        course_dict['enrollment_progress'] = 0
+        courses_data.append(course_dict)
     
-    return user, None, None
+    return {'courses': courses_data}
 
-def require_admin():
-    user, error_response, status_code = require_auth()
-    if error_response:
-        return user, error_response, status_code
+def search_catalog_payload(language, q, published_only=True, page=1, per_page=20):
+    """Ranked page of catalog courses matching q; searches are never cached"""
+    rows = search_filter(course_catalog_query(), 'courses', Course, q)
+    if published_only:
+        rows = rows.filter(Course.is_published == True)
     
-    if user.role != 'admin':
-        return None, jsonify({'error': 'Admin access required'}), 403
+    total = rows.order_by(None).count()
+    courses_data = []
+    for course, modules_count, students_count in rows.limit(per_page).offset((page - 1) * per_page).all():
+        course_dict = course.to_dict(language, modules_count, students_count)
+        course_dict['is_enrolled'] = False
+        course_dict['enrollment_progress'] = 0
+        courses_data.append(course_dict)
     
-    return user, None, None
+    return {
+        'courses': courses_data,
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'has_next': page * per_page < total,
+            'has_prev': page > 1
+        }
+    }
+
+def cached_catalog_body(cache_key, factory):
+    """Serialized payload from the catalog cache, built on the primary on a miss.
+
+    A fill from a lagging replica right after an invalidation would keep the
+    old catalog cached for everyone until the TTL runs out.
+    """
+    def fill():
+        with read_from_primary():
+            return serialize_payload(factory())
+    return catalog_cache.get_or_set(cache_key, fill)
+
+def cached_json_response(cache_key, factory):
+    """Serve an anonymous payload from the catalog cache as a JSON response"""
+    body = cached_catalog_body(cache_key, factory)
+    if body is None:
+        return None
+    return current_app.response_class(body, mimetype='application/json')
+
+def serialize_payload(payload):
+    return current_app.json.dumps(payload) if payload is not None else None
 
 @courses_bp.route('/courses', methods=['GET'])
+@use_replica
 def get_courses():
     try:
         language = request.args.get('language', 'ar')
         show_all = request.args.get('show_all', 'false').lower() == 'true'
+        q = request.args.get('q', '')
         
-        query = Course.query
+        user = g.user
         
-        # If not admin, only show published courses
-        user_id = session.get('user_id')
-        user = User.query.get(user_id) if user_id else None
+        if q.strip():
+            payload = search_catalog_payload(
+                language, q,
+                published_only=not ((user and user.role == 'admin') or show_all),
+                page=max(request.args.get('page', 1, type=int), 1),
+                per_page=min(max(request.args.get('per_page', 20, type=int), 1), 100)
+            )
+        # Admins and show_all see unpublished courses, which are never cached
+        elif (user and user.role == 'admin') or show_all:
+            payload = build_catalog_payload(language, published_only=False)
+        else:
+            cache_key = ('courses', None, language)
+            if not user:
+                return cached_json_response(cache_key, lambda: build_catalog_payload(language)), 200
+            body = cached_catalog_body(cache_key, lambda: build_catalog_payload(language))
+            payload = json.loads(body)
+        
+        # Per-user overlay: one keyed lookup for the caller's enrollments
+        if user:
+            enrollments = get_active_enrollments(user.id)
+            for course_dict in payload['courses']:
+                course_dict['is_enrolled'] = course_dict['id'] in enrollments
+                course_dict['enrollment_progress'] = enrollments.get(course_dict['id']) or 0
+        
+        return jsonify(payload), 200
         
-        if not (user and user.role == 'admin') and not show_all:
-            query = query.filter_by(is_published=True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def load_course_tree(course_id):
+    """Load a course with its counts, modules and lessons in a fixed number of queries.
+
+    Modules and lessons are eager-loaded through selectinload and come back
+    ordered by the relationship order_by, so building the response tree
+    does not touch the database again.
+    """
+    return course_catalog_query().options(
+        selectinload(Course.modules).selectinload(CourseModule.lessons)
+    ).filter(Course.id == course_id).first()
+
+def load_user_course_state(user, course_id):
+    """Resolve the caller's enrollments and lesson progress for one course.
+
+    Returns (active_enrollment, progress_enrollment, progress_by_lesson).
+    The active enrollment grants access; progress is read from the user's
+    first enrollment in the course whatever its status.
+    """
+    enrollments = CourseEnrollment.query.filter_by(
+        user_id=user.id,
+        course_id=course_id
+    ).order_by(CourseEnrollment.id).all()
+    
+    active_enrollment = next((e for e in enrollments if e.status == 'active'), None)
+    progress_enrollment = enrollments[0] if enrollments else None
+    
+    progress_by_lesson = {}
+    if progress_enrollment:
+        progress_rows = LessonProgress.query.filter_by(enrollment_id=progress_enrollment.id).all()
+        progress_by_lesson = {progress.lesson_id: progress for progress in progress_rows}
+    
+    return active_enrollment, progress_enrollment, progress_by_lesson
+
+def build_course_payload(course_id, language, include_unpublished=False):
+    """Serialize a course tree as an anonymous visitor (or admin) sees it.
+
+    Returns None when the course does not exist or is hidden. Lesson access
+    here only reflects is_free; apply_course_overlay adds the caller's
+    enrollment, subscription and progress on top.
+    """
+    row = load_course_tree(course_id)
+    if row is None:
+        return None
+    course, modules_count, students_count = row
+    
+    if not course.is_published and not include_unpublished:
+        return None
+    
+    course_dict = course.to_dict(language, modules_count, students_count)
+    
+    modules_data = []
+    for module in course.modules:
+        if not (module.is_published or include_unpublished):
+            continue
         
-        courses = query.all()
+        module_dict = module.to_dict(language, include_lessons=False)
         
-        courses_data = []
-        for course in courses:
-            course_dict = course.to_dict(language)
+        lessons_data = []
+        for lesson in module.lessons:
+            if not (lesson.is_published or include_unpublished):
+                continue
             
-            # Add enrollment status for authenticated users
-            if user:
-                enrollment = CourseEnrollment.query.filter_by(
-                    user_id=user.id, 
-                    course_id=course.id,
-                    status='active'
-                ).first()
-                course_dict['is_enrolled'] = enrollment is not None
-                course_dict['enrollment_progress'] = enrollment.progress_percentage if enrollment else 0
-            else:
-                course_dict['is_enrolled'] = False
-                course_dict['enrollment_progress'] = 0
-            
-            courses_data.append(course_dict)
+            lesson_dict = lesson.to_dict(language)
+            lesson_dict['has_access'] = bool(lesson.is_free)
+            lessons_data.append(lesson_dict)
         
-        return jsonify({'courses': courses_data}), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        module_dict['lessons'] = lessons_data
+        modules_data.append(module_dict)
+    
+    course_dict['modules'] = modules_data
+    return {'course': course_dict}
+
+def apply_course_overlay(course_dict, user):
+    """Add the caller's lesson access, progress and enrollment to a course tree"""
+    active_enrollment, progress_enrollment, progress_by_lesson = load_user_course_state(user, course_dict['id'])
+    
+    # Heartbeats not yet flushed are newer than the stored watch times
+    buffered_watch_times = watch_time_buffer.pending_for(progress_enrollment.id) if progress_enrollment else {}
+    
+    has_subscription = None
+    
+    for module_dict in course_dict['modules']:
+        for lesson_dict in module_dict['lessons']:
+            # Enrolled users or users with an active subscription
+            has_access = lesson_dict['is_free']
+            if not has_access:
+                if active_enrollment is None and has_subscription is None:
+                    has_subscription = user.has_active_subscription
+                has_access = active_enrollment is not None or bool(has_subscription)
+            
+            lesson_dict['has_access'] = bool(has_access)
+            
+            # Add progress for enrolled users
+            if has_access and progress_enrollment:
+                progress = progress_by_lesson.get(lesson_dict['id'])
+                lesson_dict['is_completed'] = progress.is_completed if progress else False
+                lesson_dict['watch_time'] = buffered_watch_times.get(
+                    lesson_dict['id'], progress.watch_time_seconds if progress else 0
+                )
+    
+    course_dict['is_enrolled'] = active_enrollment is not None
+    course_dict['enrollment'] = active_enrollment.to_dict() if active_enrollment else None
 
 @courses_bp.route('/courses/<int:course_id>', methods=['GET'])
+@use_replica
 def get_course(course_id):
     try:
         language = request.args.get('language', 'ar')
         
-        course = Course.query.get_or_404(course_id)
-        
         # Check if user can access this course
-        user_id = session.get('user_id')
-        user = User.query.get(user_id) if user_id else None
-        
-        # If course is not published and user is not admin, deny access
-        if not course.is_published and not (user and user.role == 'admin'):
+        user = g.user
+        
+        # Admins see unpublished content, which is never cached
+        if user and user.role == 'admin':
+            payload = build_course_payload(course_id, language, include_unpublished=True)
+        else:
+            cache_key = ('course', course_id, language)
+            if not user:
+                response = cached_json_response(cache_key, lambda: build_course_payload(course_id, language))
+                if response is None:
+                    return jsonify({'error': 'Course not found'}), 404
+                return response, 200
+            body = cached_catalog_body(cache_key, lambda: build_course_payload(course_id, language))
+            payload = json.loads(body) if body is not None else None
+        
+        # Missing or unpublished (for non-admins) courses look the same
+        if payload is None:
             return jsonify({'error': 'Course not found'}), 404
         
-        course_dict = course.to_dict(language)
-        
-        # Add modules with lessons
-        modules_data = []
-        for module in sorted(course.modules, key=lambda x: x.order):
-            if module.is_published or (user and user.role == 'admin'):
-                module_dict = module.to_dict(language)
-                
-                # Filter lessons based on access
-                lessons_data = []
-                for lesson in sorted(module.lessons, key=lambda x: x.order):
-                    if lesson.is_published or (user and user.role == 'admin'):
-                        lesson_dict = lesson.to_dict(language)
-                        
-                        # Check if user has access to this lesson
-                        has_access = False
-                        if lesson.is_free:
-                            has_access = True
-                        elif user:
-                            # Check if user is enrolled or has active subscription
-                            enrollment = CourseEnrollment.query.filter_by(
-                                user_id=user.id, 
-                                course_id=course.id,
-                                status='active'
-                            ).first()
-                            has_access = enrollment is not None or user.has_active_subscription
-                        
-                        lesson_dict['has_access'] = has_access
-                        
-                        # Add progress for enrolled users
-                        if user and has_access:
-                            enrollment = CourseEnrollment.query.filter_by(
-                                user_id=user.id, 
-                                course_id=course.id
-                            ).first()
-                            if enrollment:
-                                progress = LessonProgress.query.filter_by(
-                                    enrollment_id=enrollment.id,
-                                    lesson_id=lesson.id
-                                ).first()
-                                lesson_dict['is_completed'] = progress.is_completed if progress else False
-                                lesson_dict['watch_time'] = progress.watch_time_seconds if progress else 0
-                        
-                        lessons_data.append(lesson_dict)
-                
-                module_dict['lessons'] = lessons_data
-                modules_data.append(module_dict)
-        
-        course_dict['modules'] = modules_data
-        
-        # Add enrollment info for authenticated users
-        if user:
-            enrollment = CourseEnrollment.query.filter_by(
-                user_id=user.id, 
-                course_id=course.id,
-                status='active'
-            ).first()
-            course_dict['is_enrolled'] = enrollment is not None
-            course_dict['enrollment'] = enrollment.to_dict() if enrollment else None
+        apply_course_overlay(payload['course'], user)
         
-        return jsonify({'course': course_dict}), 200
+        return jsonify(payload), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @courses_bp.route('/courses/<int:course_id>/enroll', methods=['POST'])
+@login_required
 def enroll_course(course_id):
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         course = Course.query.get_or_404(course_id)
         
@@ -183,8 +319,12 @@ def enroll_course(course_id):
         )
         
         db.session.add(enrollment)
+        record_enrollment(enrollment)
         db.session.commit()
         
+        # students_count is part of the cached catalog payload
+        invalidate_catalog(course.id)
+        
         return jsonify({
             'message': 'Enrolled successfully',
             'enrollment': enrollment.to_dict()
@@ -195,11 +335,10 @@ def enroll_course(course_id):
         return jsonify({'error': str(e)}), 500
 
 @courses_bp.route('/courses/<int:course_id>/lessons/<int:lesson_id>/progress', methods=['POST'])
+@login_required
 def update_lesson_progress(course_id, lesson_id):
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         data = request.get_json()
         
@@ -219,26 +358,56 @@ def update_lesson_progress(course_id, lesson_id):
             lesson_id=lesson_id
         ).first()
         
+        # Watch-time heartbeats for an existing row go through the write-behind
+        # buffer; anything touching completion is written synchronously
+        if progress and 'watch_time_seconds' in data and 'is_completed' not in data:
+            watch_time_buffer.record(enrollment.id, lesson_id, data['watch_time_seconds'])
+            progress_dict = progress.to_dict()
+            progress_dict['watch_time_seconds'] = data['watch_time_seconds']
+            return jsonify({
+                'message': 'Progress updated',
+                'progress': progress_dict
+            }), 200
+        
+        buffered_watch_time = watch_time_buffer.discard(enrollment.id, lesson_id)
+        
         if not progress:
             progress = LessonProgress(
                 enrollment_id=enrollment.id,
-                lesson_id=lesson_id
+                lesson_id=lesson_id,
+                is_completed=False
             )
-            db.session.add(progress)
+            try:
+                # A concurrent first heartbeat may insert the same row
+                with db.session.begin_nested():
+                    db.session.add(progress)
+            except IntegrityError:
+                progress = LessonProgress.query.filter_by(
+                    enrollment_id=enrollment.id,
+                    lesson_id=lesson_id
+                ).one()
+        
+        if buffered_watch_time is not None:
+            progress.watch_time_seconds = buffered_watch_time
+        
+        was_completed = bool(progress.is_completed)
         
         # Update progress
         if 'is_completed' in data:
-            progress.is_completed = data['is_completed']
+            progress.is_completed = bool(data['is_completed'])
             if data['is_completed']:
                 progress.completion_date = datetime.utcnow()
         
         if 'watch_time_seconds' in data:
             progress.watch_time_seconds = data['watch_time_seconds']
         
-        db.session.commit()
+        # Update overall course progress in the same transaction
+        completion_delta = 0
+        if progress.is_completed != was_completed and lesson_in_course(lesson_id, course_id):
+            completion_delta = 1 if progress.is_completed else -1
+        update_course_progress(enrollment, completion_delta)
         
-        # Update overall course progress
-        update_course_progress(enrollment.id)
+        db.session.commit()
         
         return jsonify({
             'message': 'Progress updated',
@@ -249,49 +418,63 @@ def update_lesson_progress(course_id, lesson_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-def update_course_progress(enrollment_id):
-    """Update overall course progress based on lesson completion"""
-    try:
-        enrollment = CourseEnrollment.query.get(enrollment_id)
-        if not enrollment:
-            return
-        
-        # Get all lessons in the course
-        total_lessons = db.session.query(CourseLesson).join(CourseModule).filter(
-            CourseModule.course_id == enrollment.course_id,
-            CourseLesson.is_published == True
-        ).count()
-        
-        if total_lessons == 0:
-            return
-        
-        # Get completed lessons
-        completed_lessons = db.session.query(LessonProgress).join(CourseLesson).join(CourseModule).filter(
-            CourseModule.course_id == enrollment.course_id,
-            LessonProgress.enrollment_id == enrollment_id,
-            LessonProgress.is_completed == True
-        ).count()
-        
-        # Calculate progress percentage
-        progress_percentage = (completed_lessons / total_lessons) * 100
-        enrollment.progress_percentage = progress_percentage
-        
-        # Mark as completed if 100%
-        if progress_percentage >= 100:
-            enrollment.status = 'completed'
-            enrollment.completion_date = datetime.utcnow()
-        
-        db.session.commit()
-        
-    except Exception as e:
-        db.session.rollback()
+def lesson_in_course(lesson_id, course_id):
+    return db.session.query(CourseLesson.id).join(CourseModule).filter(
+        CourseLesson.id == lesson_id,
+        CourseModule.course_id == course_id
+    ).first() is not None
+
+def count_completed_lessons(enrollment):
+    return db.session.query(func.count(LessonProgress.id)).join(CourseLesson).join(CourseModule).filter(
+        CourseModule.course_id == enrollment.course_id,
+        LessonProgress.enrollment_id == enrollment.id,
+        LessonProgress.is_completed == True
+    ).scalar() or 0
+
+def update_course_progress(enrollment, completion_delta=0):
+    """Update overall course progress from the enrollment's completed counter.
+
+    The counter is adjusted by delta in SQL when a lesson's completion
+    changes, so concurrent completions of different lessons all count, and
+    the percentage is computed from the value the database returns. The
+    published lesson total comes from the per-course cache. Enrollments
+    created before the counter existed are recounted once. The caller commits.
+    """
+    if enrollment.completed_lessons_count is None:
+        # Flush so the recount sees the lesson progress being saved
+        db.session.flush()
+        enrollment.completed_lessons_count = count_completed_lessons(enrollment)
+    elif completion_delta:
+        completed = CourseEnrollment.completed_lessons_count + completion_delta
+        count = db.session.execute(
+            update(CourseEnrollment)
+            .where(CourseEnrollment.id == enrollment.id)
+            .values(completed_lessons_count=case((completed < 0, 0), else_=completed))
+            .returning(CourseEnrollment.completed_lessons_count)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+        set_committed_value(enrollment, 'completed_lessons_count', count)
+    else:
+        return
+    
+    total_lessons = get_published_lessons_count(enrollment.course_id)
+    if total_lessons == 0:
+        return
+    
+    # Calculate progress percentage
+    progress_percentage = (enrollment.completed_lessons_count / total_lessons) * 100
+    enrollment.progress_percentage = progress_percentage
+    
+    # Mark as completed if 100%
+    if progress_percentage >= 100 and enrollment.status != 'completed':
+        enrollment.status = 'completed'
+        enrollment.completion_date = datetime.utcnow()
 
 @courses_bp.route('/my-courses', methods=['GET'])
+@login_required
 def get_my_courses():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         language = request.args.get('language', 'ar')
         
@@ -310,12 +493,9 @@ def get_my_courses():
 
 # Admin routes
 @courses_bp.route('/admin/courses', methods=['POST'])
+@admin_required
 def create_course():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         required_fields = ['title_ar', 'title_en', 'description_ar', 'description_en']
@@ -338,6 +518,7 @@ def create_course():
         
         db.session.add(course)
         db.session.commit()
+        invalidate_catalog(course.id)
         
         return jsonify({
             'message': 'Course created successfully',
@@ -349,12 +530,9 @@ def create_course():
         return jsonify({'error': str(e)}), 500
 
 @courses_bp.route('/admin/courses/<int:course_id>', methods=['PUT'])
+@admin_required
 def update_course(course_id):
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         course = Course.query.get_or_404(course_id)
         data = request.get_json()
         
@@ -371,6 +549,7 @@ def update_course(course_id):
         
         course.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_catalog(course.id)
         
         return jsonify({
             'message': 'Course updated successfully',
@@ -1,33 +1,16 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User
+from flask import Blueprint, request, jsonify
+from src.db import db, use_replica
+from src.services.auth import login_required, admin_required
 from src.models.marketing import NewsletterSubscriber, EmailCampaign, LandingPage, Coupon
+from src.services.search import search_join
+from src.services.pagination import paginate
+from src.services.export import export_response
 from datetime import datetime
 import json
 import re
 
 marketing_bp = Blueprint('marketing', __name__)
 
-def require_auth():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None, jsonify({'error': 'Authentication required'}), 401
-    
-    user = User.query.get(user_id)
-    if not user:
-        return None, jsonify({'error': 'User not found'}), 404
-    
-    return user, None, None
-
-def require_admin():
-    user, error_response, status_code = require_auth()
-    if error_response:
-        return user, error_response, status_code
-    
-    if user.role != 'admin':
-        return None, jsonify({'error': 'Admin access required'}), 403
-    
-    return user, None, None
-
 def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
@@ -188,12 +171,9 @@ def validate_coupon():
         return jsonify({'error': str(e)}), 500
 
 @marketing_bp.route('/coupons/apply', methods=['POST'])
+@login_required
 def apply_coupon():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         if not data.get('code'):
@@ -220,43 +200,82 @@ def apply_coupon():
         return jsonify({'error': str(e)}), 500
 
 # Admin routes
+def filter_subscribers(query, args):
+    """Apply the admin subscriber list filters and search.
+
+    Returns (query, score); score is the search rank column when ?q= has
+    searchable terms, otherwise None.
+    """
+    is_subscribed = args.get('is_subscribed')
+    language = args.get('language')
+    source = args.get('source')
+    
+    if is_subscribed is not None:
+        query = query.filter(NewsletterSubscriber.is_subscribed == (is_subscribed.lower() == 'true'))
+    
+    if language:
+        query = query.filter(NewsletterSubscriber.language_preference == language)
+    
+    if source:
+        query = query.filter(NewsletterSubscriber.subscription_source == source)
+    
+    return search_join(query, 'subscribers', NewsletterSubscriber, args.get('q', ''))
+
 @marketing_bp.route('/admin/newsletter/subscribers', methods=['GET'])
+@admin_required
 def get_newsletter_subscribers():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
-        is_subscribed = request.args.get('is_subscribed')
-        language = request.args.get('language')
-        source = request.args.get('source')
-        
-        query = NewsletterSubscriber.query
-        
-        if is_subscribed is not None:
-            query = query.filter_by(is_subscribed=is_subscribed.lower() == 'true')
-        
-        if language:
-            query = query.filter_by(language_preference=language)
-        
-        if source:
-            query = query.filter_by(subscription_source=source)
+        # Full-text matches come back best first; otherwise newest first
+        query, score = filter_subscribers(NewsletterSubscriber.query, request.args)
+        try:
+            if score is not None:
+                rows, pagination = paginate(
+                    query.add_columns(score), [score, NewsletterSubscriber.id], descending=False
+                )
+                subscribers = [row[0] for row in rows]
+            else:
+                subscribers, pagination = paginate(
+                    query, [NewsletterSubscriber.subscribed_at, NewsletterSubscriber.id]
+                )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        subscribers = query.order_by(NewsletterSubscriber.subscribed_at.desc()).all()
         subscribers_data = [subscriber.to_dict() for subscriber in subscribers]
         
-        return jsonify({'subscribers': subscribers_data}), 200
+        return jsonify({'subscribers': subscribers_data, 'pagination': pagination}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+SUBSCRIBER_EXPORT_FIELDS = [
+    'id', 'email', 'name', 'language_preference', 'is_subscribed', 'subscription_source',
+    'tags', 'subscribed_at', 'unsubscribed_at'
+]
+
+def subscriber_export_row(subscriber):
+    row = {field: getattr(subscriber, field) for field in SUBSCRIBER_EXPORT_FIELDS}
+    row['tags'] = ', '.join(subscriber.to_dict()['tags'])
+    return row
+
+@marketing_bp.route('/admin/newsletter/subscribers/export', methods=['GET'])
+@admin_required
+@use_replica
+def export_newsletter_subscribers():
+    try:
+        query, score = filter_subscribers(NewsletterSubscriber.query, request.args)
+        query = query.order_by(NewsletterSubscriber.id)
+        try:
+            return export_response(query, SUBSCRIBER_EXPORT_FIELDS, subscriber_export_row, 'subscribers')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @marketing_bp.route('/admin/email-campaigns', methods=['POST'])
+@admin_required
 def create_email_campaign():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         required_fields = ['name', 'subject_ar', 'subject_en', 'content_ar', 'content_en']
@@ -295,12 +314,9 @@ def create_email_campaign():
         return jsonify({'error': str(e)}), 500
 
 @marketing_bp.route('/admin/email-campaigns', methods=['GET'])
+@admin_required
 def get_email_campaigns():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         language = request.args.get('language', 'ar')
         status_filter = request.args.get('status')
         campaign_type = request.args.get('campaign_type')
@@ -313,21 +329,21 @@ def get_email_campaigns():
         if campaign_type:
             query = query.filter_by(campaign_type=campaign_type)
         
-        campaigns = query.order_by(EmailCampaign.created_at.desc()).all()
+        try:
+            campaigns, pagination = paginate(query, [EmailCampaign.created_at, EmailCampaign.id])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         campaigns_data = [campaign.to_dict(language) for campaign in campaigns]
         
-        return jsonify({'campaigns': campaigns_data}), 200
+        return jsonify({'campaigns': campaigns_data, 'pagination': pagination}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @marketing_bp.route('/admin/landing-pages', methods=['POST'])
+@admin_required
 def create_landing_page():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         required_fields = ['name', 'slug', 'title_ar', 'title_en']
@@ -372,12 +388,9 @@ def create_landing_page():
         return jsonify({'error': str(e)}), 500
 
 @marketing_bp.route('/admin/coupons', methods=['POST'])
+@admin_required
 def create_coupon():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         required_fields = ['code', 'discount_type', 'discount_value']
@@ -432,12 +445,9 @@ def create_coupon():
         return jsonify({'error': str(e)}), 500
 
 @marketing_bp.route('/admin/coupons', methods=['GET'])
+@admin_required
 def get_coupons():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         language = request.args.get('language', 'ar')
         is_active = request.args.get('is_active')
         applicable_to = request.args.get('applicable_to')
@@ -450,10 +460,13 @@ def get_coupons():
         if applicable_to:
             query = query.filter_by(applicable_to=applicable_to)
         
-        coupons = query.order_by(Coupon.created_at.desc()).all()
+        try:
+            coupons, pagination = paginate(query, [Coupon.created_at, Coupon.id])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         coupons_data = [coupon.to_dict(language) for coupon in coupons]
         
-        return jsonify({'coupons': coupons_data}), 200
+        return jsonify({'coupons': coupons_data, 'pagination': pagination}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
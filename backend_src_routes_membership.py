@@ -1,33 +1,18 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User
+from flask import Blueprint, request, jsonify, g
+from src.db import db, use_replica
+from src.services.auth import login_required, admin_required
 from src.models.membership import MembershipPlan, Subscription, Payment
+from src.services.metrics import record_payment_completed
+from src.services.pagination import paginate
+from src.services.export import export_response
+from sqlalchemy.orm import joinedload, contains_eager
 from datetime import datetime, timedelta
 import json
 
 membership_bp = Blueprint('membership', __name__)
 
-def require_auth():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None, jsonify({'error': 'Authentication required'}), 401
-    
-    user = User.query.get(user_id)
-    if not user:
-        return None, jsonify({'error': 'User not found'}), 404
-    
-    return user, None, None
-
-def require_admin():
-    user, error_response, status_code = require_auth()
-    if error_response:
-        return user, error_response, status_code
-    
-    if user.role != 'admin':
-        return None, jsonify({'error': 'Admin access required'}), 403
-    
-    return user, None, None
-
 @membership_bp.route('/membership-plans', methods=['GET'])
+@use_replica
 def get_membership_plans():
     try:
         language = request.args.get('language', 'ar')
@@ -41,6 +26,7 @@ def get_membership_plans():
         return jsonify({'error': str(e)}), 500
 
 @membership_bp.route('/membership-plans/<int:plan_id>', methods=['GET'])
+@use_replica
 def get_membership_plan(plan_id):
     try:
         language = request.args.get('language', 'ar')
@@ -56,11 +42,10 @@ def get_membership_plan(plan_id):
         return jsonify({'error': str(e)}), 500
 
 @membership_bp.route('/subscribe', methods=['POST'])
+@login_required
 def subscribe():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         data = request.get_json()
         
@@ -129,11 +114,10 @@ def subscribe():
         return jsonify({'error': str(e)}), 500
 
 @membership_bp.route('/subscription/confirm-payment', methods=['POST'])
+@login_required
 def confirm_subscription_payment():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         data = request.get_json()
         
@@ -164,6 +148,7 @@ def confirm_subscription_payment():
             subscription.status = 'active'
             subscription.payment_status = 'paid'
         
+        record_payment_completed(payment)
         db.session.commit()
         
         return jsonify({
@@ -176,11 +161,10 @@ def confirm_subscription_payment():
         return jsonify({'error': str(e)}), 500
 
 @membership_bp.route('/my-subscription', methods=['GET'])
+@login_required
 def get_my_subscription():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         subscription = user.get_active_subscription()
         
@@ -196,11 +180,10 @@ def get_my_subscription():
         return jsonify({'error': str(e)}), 500
 
 @membership_bp.route('/subscription/cancel', methods=['POST'])
+@login_required
 def cancel_subscription():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         subscription = user.get_active_subscription()
         
@@ -297,11 +280,10 @@ def get_payment_methods():
         return jsonify({'error': str(e)}), 500
 
 @membership_bp.route('/my-payments', methods=['GET'])
+@login_required
 def get_my_payments():
     try:
-        user, error_response, status_code = require_auth()
-        if error_response:
-            return error_response, status_code
+        user = g.user
         
         payments = Payment.query.filter_by(user_id=user.id).order_by(Payment.payment_date.desc()).all()
         payments_data = [payment.to_dict() for payment in payments]
@@ -313,12 +295,9 @@ def get_my_payments():
 
 # Admin routes
 @membership_bp.route('/admin/membership-plans', methods=['POST'])
+@admin_required
 def create_membership_plan():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         data = request.get_json()
         
         required_fields = ['name_ar', 'name_en', 'price', 'duration_days']
@@ -358,12 +337,9 @@ def create_membership_plan():
         return jsonify({'error': str(e)}), 500
 
 @membership_bp.route('/admin/subscriptions', methods=['GET'])
+@admin_required
 def get_all_subscriptions():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
         status_filter = request.args.get('status')
         plan_id = request.args.get('plan_id', type=int)
         
@@ -375,7 +351,13 @@ def get_all_subscriptions():
         if plan_id:
             query = query.filter_by(plan_id=plan_id)
         
-        subscriptions = query.order_by(Subscription.created_at.desc()).all()
+        try:
+            subscriptions, pagination = paginate(
+                query.options(joinedload(Subscription.user), joinedload(Subscription.plan)),
+                [Subscription.created_at, Subscription.id]
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         subscriptions_data = []
         for subscription in subscriptions:
@@ -384,46 +366,52 @@ def get_all_subscriptions():
             subscription_dict['plan'] = subscription.plan.to_dict()
             subscriptions_data.append(subscription_dict)
         
-        return jsonify({'subscriptions': subscriptions_data}), 200
+        return jsonify({'subscriptions': subscriptions_data, 'pagination': pagination}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def filter_payments(query, args):
+    """Apply the admin payment list filters; raises ValueError for bad dates"""
+    status_filter = args.get('status')
+    payment_method = args.get('payment_method')
+    date_from = args.get('date_from')
+    date_to = args.get('date_to')
+    
+    if status_filter:
+        query = query.filter(Payment.status == status_filter)
+    
+    if payment_method:
+        query = query.filter(Payment.payment_method == payment_method)
+    
+    if date_from:
+        try:
+            date_from = datetime.strptime(date_from, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Invalid date_from format')
+        query = query.filter(Payment.payment_date >= date_from)
+    
+    if date_to:
+        try:
+            date_to = datetime.strptime(date_to, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Invalid date_to format')
+        query = query.filter(Payment.payment_date <= date_to)
+    
+    return query
+
 @membership_bp.route('/admin/payments', methods=['GET'])
+@admin_required
 def get_all_payments():
     try:
-        user, error_response, status_code = require_admin()
-        if error_response:
-            return error_response, status_code
-        
-        status_filter = request.args.get('status')
-        payment_method = request.args.get('payment_method')
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        
-        query = Payment.query
-        
-        if status_filter:
-            query = query.filter_by(status=status_filter)
-        
-        if payment_method:
-            query = query.filter_by(payment_method=payment_method)
-        
-        if date_from:
-            try:
-                date_from = datetime.strptime(date_from, '%Y-%m-%d')
-                query = query.filter(Payment.payment_date >= date_from)
-            except ValueError:
-                return jsonify({'error': 'Invalid date_from format'}), 400
-        
-        if date_to:
-            try:
-                date_to = datetime.strptime(date_to, '%Y-%m-%d')
-                query = query.filter(Payment.payment_date <= date_to)
-            except ValueError:
-                return jsonify({'error': 'Invalid date_to format'}), 400
-        
-        payments = query.order_by(Payment.payment_date.desc()).all()
+        try:
+            query = filter_payments(Payment.query, request.args)
+            payments, pagination = paginate(
+                query.options(joinedload(Payment.user)),
+                [Payment.payment_date, Payment.id]
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         payments_data = []
         for payment in payments:
@@ -431,7 +419,48 @@ def get_all_payments():
             payment_dict['user'] = payment.user.to_dict()
             payments_data.append(payment_dict)
         
-        return jsonify({'payments': payments_data}), 200
+        return jsonify({'payments': payments_data, 'pagination': pagination}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+PAYMENT_EXPORT_FIELDS = [
+    'id', 'payment_date', 'amount', 'currency', 'status', 'payment_method', 'payment_gateway',
+    'payment_type', 'transaction_id', 'gateway_transaction_id', 'related_entity_type',
+    'related_entity_id', 'user_id', 'user_name', 'user_email'
+]
+
+def payment_export_row(payment):
+    return {
+        'id': payment.id,
+        'payment_date': payment.payment_date,
+        'amount': payment.amount,
+        'currency': payment.currency,
+        'status': payment.status,
+        'payment_method': payment.payment_method,
+        'payment_gateway': payment.payment_gateway,
+        'payment_type': payment.payment_type,
+        'transaction_id': payment.transaction_id,
+        'gateway_transaction_id': payment.gateway_transaction_id,
+        'related_entity_type': payment.related_entity_type,
+        'related_entity_id': payment.related_entity_id,
+        'user_id': payment.user_id,
+        'user_name': payment.user.full_name,
+        'user_email': payment.user.email
+    }
+
+@membership_bp.route('/admin/payments/export', methods=['GET'])
+@admin_required
+@use_replica
+def export_payments():
+    try:
+        try:
+            query = filter_payments(Payment.query, request.args).join(Payment.user).options(
+                contains_eager(Payment.user)
+            ).order_by(Payment.id)
+            return export_response(query, PAYMENT_EXPORT_FIELDS, payment_export_row, 'payments')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from src.models.user import db, User
+from src.db import db
+from src.models.user import User
 from src.models.course import Course, CourseModule, CourseLesson
 from src.models.booking import Service, AvailableSlot
 from src.models.membership import MembershipPlan
 from src.models.marketing import NewsletterSubscriber, LandingPage, Coupon
+from src.migrations.runner import upgrade
+from src.services.metrics import record_user_registered
+from sqlalchemy import inspect
 from datetime import datetime, time, timedelta
 import json
 from werkzeug.security import generate_password_hash
@@ -14,6 +18,11 @@ setup_bp = Blueprint('setup', __name__)
 def initialize_system():
     """Initialize the system with default data"""
     try:
+        # A fresh deployment has no tables yet, so create the schema here;
+        # existing databases are only migrated with 'flask db upgrade'
+        if not inspect(db.engine).get_table_names():
+            upgrade()
+        
         # Check if system is already initialized
         admin_user = User.query.filter_by(role='admin').first()
         if admin_user:
@@ -34,6 +43,7 @@ def initialize_system():
         )
         db.session.add(admin_user)
         db.session.flush()
+        record_user_registered(admin_user)
 
         # Create membership plans
         monthly_plan = MembershipPlan(
@@ -158,19 +168,19 @@ def initialize_system():
             (time(20, 0), time(21, 0)),   # 8-9 PM
         ]
 
+        # One weekly rule per weekday and time, expanded when availability is read
         start_date = datetime.now().date()
-        for i in range(30):  # Next 30 days
-            current_date = start_date + timedelta(days=i)
-            if current_date.weekday() in weekdays:
-                for start_time, end_time in times:
-                    slot = AvailableSlot(
-                        date=current_date,
-                        start_time=start_time,
-                        end_time=end_time,
-                        is_recurring=True,
-                        recurring_pattern='weekly'
-                    )
-                    db.session.add(slot)
+        for weekday in weekdays:
+            first_date = start_date + timedelta(days=(weekday - start_date.weekday()) % 7)
+            for start_time, end_time in times:
+                slot = AvailableSlot(
+                    date=first_date,
+                    start_time=start_time,
+                    end_time=end_time,
+                    is_recurring=True,
+                    recurring_pattern='weekly'
+                )
+                db.session.add(slot)
 
         # Create free course
         free_course = Course(
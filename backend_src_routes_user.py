@@ -1,12 +1,18 @@
 from flask import Blueprint, jsonify, request
-from src.models.user import User, db
+from src.db import db
+from src.models.user import User
+from src.services.metrics import record_user_registered
+from src.services.pagination import paginate
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    try:
+        users, pagination = paginate(User.query, [User.id], descending=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'users': [user.to_dict() for user in users], 'pagination': pagination})
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
@@ -14,6 +20,7 @@ def create_user():
     data = request.json
     user = User(username=data['username'], email=data['email'])
     db.session.add(user)
+    record_user_registered(user)
     db.session.commit()
     return jsonify(user.to_dict()), 201
 
@@ -0,0 +1,77 @@
+from functools import wraps
+from flask import g, jsonify, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from src.db import db
+from src.models.user import User
+from src.services.cache import ResponseCache
+
+# Column values of recently seen users keyed by id. Edits made by this
+# process drop the entry on commit; the TTL bounds how long another app
+# server's role or password change can go unnoticed here.
+identity_cache = ResponseCache(ttl=30, max_entries=4096)
+
+USER_COLUMNS = User.__table__.columns.keys()
+
+def _load_user(user_id):
+    values = identity_cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            identity_cache.set(user_id, {key: getattr(user, key) for key in USER_COLUMNS})
+        return user
+
+    user = db.session.identity_map.get(db.session.identity_key(User, user_id))
+    if user is None:
+        # Attach a fresh instance built from the cached row, without a SELECT
+        user = User(**values)
+        make_transient_to_detached(user)
+        db.session.add(user)
+    return user
+
+def load_current_user():
+    """before_request hook: resolve the session's user once into g.user"""
+    user_id = session.get('user_id')
+    g.user = _load_user(user_id) if user_id else None
+
+def init_auth(app):
+    identity_cache.ttl = app.config.get('AUTH_CACHE_TTL', identity_cache.ttl)
+    app.before_request(load_current_user)
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not session.get('user_id'):
+            return jsonify({'error': 'Authentication required'}), 401
+        if g.user is None:
+            # The account is gone; drop the stale login
+            session.clear()
+            return jsonify({'error': 'User not found'}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+def admin_required(view):
+    @login_required
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.user.role != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def _user_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('users_changed', set()).add(target.id)
+
+for _event_name in ('after_update', 'after_delete'):
+    event.listen(User, _event_name, _user_changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_users_after_commit(session):
+    for user_id in session.info.pop('users_changed', ()):
+        identity_cache.invalidate(lambda key: key == user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_changes(session):
+    session.info.pop('users_changed', None)
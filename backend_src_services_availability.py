@@ -0,0 +1,376 @@
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import date, time, timedelta
+from sqlalchemy import or_, and_
+import json
+import threading
+import time as clock
+from src.db import db
+from src.models.booking import Booking, AvailableSlot
+
+# Bookings in these statuses occupy their time range
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed')
+
+# Start times offered on weekdays when no slots are predefined, in minutes
+DEFAULT_SLOT_STARTS = (9 * 60, 10 * 60 + 30, 12 * 60, 13 * 60 + 30, 15 * 60, 16 * 60 + 30, 18 * 60)
+
+MINUTES_PER_DAY = 24 * 60
+
+# Intervals are half-open (start, end) pairs of minutes since midnight,
+# kept in per-day lists sorted by start.
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+def to_time(minutes):
+    minutes = min(minutes, MINUTES_PER_DAY - 1)
+    return time(minutes // 60, minutes % 60)
+
+def merge_intervals(intervals):
+    """Sort and coalesce overlapping or touching intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def subtract_intervals(free, busy):
+    """Remove merged busy intervals from merged free intervals"""
+    result = []
+    j = 0
+    for start, end in free:
+        # Skip busy intervals that end before this free interval starts
+        while j < len(busy) and busy[j][1] <= start:
+            j += 1
+        k = j
+        cursor = start
+        while k < len(busy) and busy[k][0] < end:
+            if busy[k][0] > cursor:
+                result.append((cursor, busy[k][0]))
+            cursor = max(cursor, busy[k][1])
+            k += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+def overlaps(busy, start, end):
+    """True if [start, end) intersects any interval in a merged busy list"""
+    i = bisect_left(busy, (end,))
+    return i > 0 and busy[i - 1][1] > start
+
+# Days between occurrences for AvailableSlot.recurring_pattern
+RECURRENCE_STEPS = {'daily': 1, 'weekly': 7, 'biweekly': 14}
+
+# Expanded occurrences per (rule, month); the rule's defining fields are
+# part of the key, so editing a rule never serves stale dates
+_occurrence_cache = {}
+_occurrence_lock = threading.Lock()
+_OCCURRENCE_CACHE_LIMIT = 10000
+
+def month_bounds(year, month):
+    first = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return first, next_month - timedelta(days=1)
+
+def expand_occurrences(first_date, step, until, exceptions, start_date, end_date):
+    """Occurrence dates of a recurrence inside [start_date, end_date].
+
+    The first occurrence on or after start_date is found arithmetically and
+    the rest come from a stepped range, so no day outside the result is
+    visited.
+    """
+    last = min(end_date, until) if until else end_date
+    if last < first_date:
+        return []
+    if start_date <= first_date:
+        offset = 0
+    else:
+        offset = -(-(start_date - first_date).days // step) * step
+    span = (last - first_date).days
+    return [
+        day for day in (first_date + timedelta(days=days) for days in range(offset, span + 1, step))
+        if day not in exceptions
+    ]
+
+def month_occurrences(rule_key, first_date, step, until, exceptions, year, month):
+    key = (rule_key, year, month)
+    with _occurrence_lock:
+        cached = _occurrence_cache.get(key)
+    if cached is not None:
+        return cached
+
+    month_start, month_end = month_bounds(year, month)
+    occurrences = expand_occurrences(first_date, step, until, exceptions, month_start, month_end)
+
+    with _occurrence_lock:
+        if len(_occurrence_cache) >= _OCCURRENCE_CACHE_LIMIT:
+            _occurrence_cache.clear()
+        _occurrence_cache[key] = occurrences
+    return occurrences
+
+def expand_recurring_slot(row, start_date, end_date):
+    """Dates in [start_date, end_date] on which a recurring slot row applies"""
+    step = RECURRENCE_STEPS.get(row.recurring_pattern)
+    if step is None:
+        # Unknown pattern: treat the row as a one-off slot
+        return [row.date] if start_date <= row.date <= end_date else []
+
+    exceptions = set()
+    if row.exception_dates:
+        try:
+            exceptions = {date.fromisoformat(value) for value in json.loads(row.exception_dates)}
+        except (TypeError, ValueError):
+            pass
+
+    rule_key = (row.id, row.date, step, row.recurring_until, row.exception_dates)
+    occurrences = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        for day in month_occurrences(rule_key, row.date, step, row.recurring_until, exceptions, year, month):
+            if start_date <= day <= end_date:
+                occurrences.append(day)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return occurrences
+
+def load_slot_intervals(start_date, end_date):
+    """Predefined availability per day as merged intervals.
+
+    One-off slots are read for the window; recurring slots are stored once
+    and expanded over the window here.
+    """
+    rows = db.session.query(
+        AvailableSlot.id,
+        AvailableSlot.date,
+        AvailableSlot.start_time,
+        AvailableSlot.end_time,
+        AvailableSlot.is_recurring,
+        AvailableSlot.recurring_pattern,
+        AvailableSlot.recurring_until,
+        AvailableSlot.exception_dates
+    ).filter(
+        AvailableSlot.is_available == True,
+        or_(
+            and_(
+                or_(AvailableSlot.is_recurring == False, AvailableSlot.is_recurring.is_(None)),
+                AvailableSlot.date >= start_date,
+                AvailableSlot.date <= end_date
+            ),
+            and_(
+                AvailableSlot.is_recurring == True,
+                AvailableSlot.date <= end_date,
+                or_(AvailableSlot.recurring_until.is_(None), AvailableSlot.recurring_until >= start_date)
+            )
+        )
+    ).all()
+
+    by_day = defaultdict(list)
+    for row in rows:
+        interval = (to_minutes(row.start_time), to_minutes(row.end_time) or MINUTES_PER_DAY)
+        if row.is_recurring:
+            for day in expand_recurring_slot(row, start_date, end_date):
+                by_day[day].append(interval)
+        else:
+            by_day[row.date].append(interval)
+    return {day: merge_intervals(intervals) for day, intervals in by_day.items()}
+
+def load_booking_intervals(service_id, start_date, end_date, default_duration):
+    """Time occupied by active bookings of a service per day, merged"""
+    rows = db.session.query(
+        Booking.booking_date,
+        Booking.booking_time,
+        Booking.duration_minutes
+    ).filter(
+        Booking.service_id == service_id,
+        Booking.booking_date >= start_date,
+        Booking.booking_date <= end_date,
+        Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+    ).all()
+
+    by_day = defaultdict(list)
+    for day, booking_time, duration in rows:
+        start = to_minutes(booking_time)
+        by_day[day].append((start, min(start + (duration or default_duration), MINUTES_PER_DAY)))
+    return {day: merge_intervals(intervals) for day, intervals in by_day.items()}
+
+# Materialized availability of one service on one day. slot_sessions are
+# cut from predefined slots, default_sessions from the weekday schedule.
+DaySessions = namedtuple('DaySessions', 'day has_slots slot_sessions default_sessions')
+
+def free_windows(slots, busy, duration):
+    """Free (start, end) windows of at least duration minutes in one day"""
+    return [
+        (start, end)
+        for start, end in subtract_intervals(slots, busy)
+        if end - start >= duration
+    ]
+
+def split_windows(day, windows, duration):
+    """Cut free windows into back-to-back bookable sessions of duration minutes"""
+    sessions = []
+    for start, end in windows:
+        while start + duration <= end:
+            sessions.append((day, start, start + duration))
+            start += duration
+    return sessions
+
+def default_sessions(day, busy, duration):
+    """Default weekday sessions that do not overlap a booking"""
+    # Skip weekends for default slots (Monday = 0, Sunday = 6)
+    if day.weekday() >= 5:
+        return []
+    sessions = []
+    for start in DEFAULT_SLOT_STARTS:
+        end = min(start + duration, MINUTES_PER_DAY)
+        if not overlaps(busy, start, end):
+            sessions.append((day, start, end))
+    return sessions
+
+def build_days(service_id, duration, start_date, end_date):
+    """Compute DaySessions for every day in a range with two queries"""
+    busy_by_day = load_booking_intervals(service_id, start_date, end_date, duration)
+    slots_by_day = load_slot_intervals(start_date, end_date)
+
+    days = {}
+    for offset in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=offset)
+        busy = busy_by_day.get(day, [])
+        slots = slots_by_day.get(day)
+        days[day] = DaySessions(
+            day=day,
+            has_slots=bool(slots),
+            slot_sessions=split_windows(day, free_windows(slots, busy, duration), duration) if slots else [],
+            default_sessions=default_sessions(day, busy, duration)
+        )
+    return days
+
+def select_sessions(days):
+    """Predefined sessions for the range, or the defaults if none are predefined"""
+    if any(day.has_slots for day in days):
+        return [session for day in days for session in day.slot_sessions]
+    return [session for day in days for session in day.default_sessions]
+
+def find_available_sessions(service, start_date, end_date):
+    """Bookable (date, start, end) sessions for a service, computed from scratch.
+
+    Predefined slots minus the service's active bookings, cut into sessions
+    of the service duration. When no slots are predefined in the range, the
+    default weekday schedule is offered instead.
+    """
+    days = build_days(service.id, service.duration_minutes or 60, start_date, end_date)
+    return select_sessions([days[day] for day in sorted(days)])
+
+class AvailabilityCalendar:
+    """Per-service, per-day availability kept in memory between requests.
+
+    Reads scan the materialized days of the range and only rebuild the days
+    that are missing or expired, with one slot query and one booking query
+    for the whole gap. Writers call invalidate() after committing; a
+    rebuild that raced with an invalidation is discarded instead of stored.
+    Entries also expire after ttl seconds so that other worker processes,
+    which keep their own calendar, converge without coordination.
+    """
+
+    def __init__(self, ttl=60, max_days=20000):
+        self.ttl = ttl
+        self.max_days = max_days
+        self._days = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_sessions(self, service, start_date, end_date):
+        duration = service.duration_minutes or 60
+        days = self._materialize(service.id, duration, start_date, end_date)
+        return select_sessions(days)
+
+    def invalidate(self, day, service_id=None):
+        """Forget one day for a service, or for every service if none is given"""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._days if key[1] == day and (service_id is None or key[0] == service_id)]:
+                del self._days[key]
+
+    def invalidate_all(self):
+        with self._lock:
+            self._generation += 1
+            self._days.clear()
+
+    def check(self, service, start_date, end_date, repair=False):
+        """Diff materialized days against a rebuild from the live tables.
+
+        Returns a list of mismatching days; with repair=True the rebuilt
+        days replace the materialized ones.
+        """
+        duration = service.duration_minutes or 60
+        live = build_days(service.id, duration, start_date, end_date)
+
+        with self._lock:
+            now = clock.monotonic()
+            mismatches = []
+            for day in sorted(live):
+                entry = self._days.get((service.id, day))
+                if entry is None or entry[0] <= now or entry[1] != duration:
+                    continue
+                if entry[2] != live[day]:
+                    mismatches.append({
+                        'date': day.isoformat(),
+                        'materialized': format_sessions(select_sessions([entry[2]]), duration),
+                        'live': format_sessions(select_sessions([live[day]]), duration)
+                    })
+
+            if repair:
+                self._generation += 1
+                expires_at = now + self.ttl
+                for day, sessions in live.items():
+                    self._days[(service.id, day)] = (expires_at, duration, sessions)
+
+        return mismatches
+
+    def _materialize(self, service_id, duration, start_date, end_date):
+        now = clock.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            generation = self._generation
+            for offset in range((end_date - start_date).days + 1):
+                day = start_date + timedelta(days=offset)
+                entry = self._days.get((service_id, day))
+                if entry is not None and entry[0] > now and entry[1] == duration:
+                    found[day] = entry[2]
+                else:
+                    missing.append(day)
+
+        if missing:
+            built = build_days(service_id, duration, missing[0], missing[-1])
+            with self._lock:
+                if generation == self._generation:
+                    if len(self._days) + len(missing) > self.max_days:
+                        self._prune(now)
+                    expires_at = now + self.ttl
+                    for day in missing:
+                        self._days[(service_id, day)] = (expires_at, duration, built[day])
+            for day in missing:
+                found[day] = built[day]
+
+        return [found[day] for day in sorted(found)]
+
+    def _prune(self, now):
+        for key in [key for key, entry in self._days.items() if entry[0] <= now]:
+            del self._days[key]
+        if len(self._days) > self.max_days:
+            self._days.clear()
+
+availability_calendar = AvailabilityCalendar()
+
+def format_sessions(sessions, duration):
+    return [
+        {
+            'date': day.isoformat(),
+            'start_time': to_time(start).strftime('%H:%M'),
+            'end_time': to_time(end).strftime('%H:%M'),
+            'duration_minutes': duration
+        }
+        for day, start, end in sessions
+    ]
@@ -0,0 +1,124 @@
+import threading
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.course import CourseModule, CourseLesson
+
+class ResponseCache:
+    """Small in-process cache for serialized responses.
+
+    Entries expire after ttl seconds (None keeps them until invalidated) and
+    the oldest entries are evicted past max_entries. get_or_set() computes a
+    missing entry once even when several requests ask for it concurrently,
+    and a fill that overlaps an invalidation is returned but not stored.
+    """
+
+    def __init__(self, ttl=None, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries.pop(key, None)
+        self._entries[key] = (value, expires_at)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def get_or_set(self, key, factory):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another request may have filled the entry while we waited
+            value = self.get(key)
+            if value is None:
+                with self._lock:
+                    generation = self._generation
+                value = factory()
+                if value is not None:
+                    with self._lock:
+                        # An invalidation during the fill means value may be stale
+                        if generation == self._generation:
+                            self._store(key, value)
+
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key matches predicate"""
+        with self._lock:
+            self._generation += 1
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+# Anonymous catalog payloads keyed by (endpoint, course_id, language)
+catalog_cache = ResponseCache(ttl=300)
+
+def invalidate_catalog(course_id=None):
+    """Drop the cached catalog list and one course's detail (or every course)"""
+    catalog_cache.invalidate(
+        lambda key: key[0] == 'courses' or course_id is None or key[1] == course_id
+    )
+
+def _mark_catalog_changed(session, course_id):
+    changed = session.info.setdefault('catalog_changed', set())
+    changed.add(course_id)
+
+def _module_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        # A module moved between courses changes both, so drop everything
+        moved = inspect(target).attrs.course_id.history.deleted
+        _mark_catalog_changed(session, None if moved else target.course_id)
+
+def _lesson_changed(mapper, connection, target):
+    # The owning course is not loaded here, so lesson edits drop every course
+    session = Session.object_session(target)
+    if session is not None:
+        _mark_catalog_changed(session, None)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(CourseModule, _event_name, _module_changed)
+    event.listen(CourseLesson, _event_name, _lesson_changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_catalog_after_commit(session):
+    changed = session.info.pop('catalog_changed', None)
+    if not changed:
+        return
+    if None in changed:
+        invalidate_catalog()
+    else:
+        for course_id in changed:
+            invalidate_catalog(course_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_changes(session):
+    session.info.pop('catalog_changed', None)
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from flask import Response, request, stream_with_context
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Rows fetched per round trip; also the number of rows per streamed chunk
+EXPORT_BATCH_SIZE = 500
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+# Leading characters that make spreadsheet apps evaluate a cell as a formula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _csv_cell(value):
+    value = _plain(value)
+    # Text such as a subscriber name of '=HYPERLINK(...)' comes from public
+    # forms; the quote makes Excel show it as text instead of running it
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _csv_chunks(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Excel needs the BOM to open UTF-8 (Arabic) text correctly
+    buffer.write('\ufeff')
+    writer.writerow(fields)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_cell(row.get(field)) for field in fields])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_chunks(rows, fields):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({field: _plain(row.get(field)) for field in fields}, ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def export_response(query, fields, serialize, filename):
+    """Stream query as a CSV or NDJSON attachment (?format=, default csv).
+
+    Rows are read with yield_per so only one batch is in memory at a time,
+    and each batch is written out as a chunk of the response. serialize
+    turns one result row into a dict keyed by fields. Raises ValueError for
+    an unknown format.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {export_format}')
+
+    rows = (serialize(row) for row in query.yield_per(EXPORT_BATCH_SIZE))
+    chunks = _csv_chunks(rows, fields) if export_format == 'csv' else _ndjson_chunks(rows, fields)
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}-{date.today().isoformat()}.{export_format}"',
+            'Cache-Control': 'no-store'
+        }
+    )
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func
+from src.db import db, day_of, upsert
+from src.models.user import User
+from src.models.course import CourseEnrollment
+from src.models.booking import Booking
+from src.models.membership import Payment
+from src.models.metrics import DailyMetric, DailyBookingMetric
+
+# Incremental maintenance: every write path that changes a rolled-up number
+# calls one of the record_* helpers inside its own transaction, so the
+# rollup commits (or rolls back) together with the change itself.
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+def _bump_daily(day, **deltas):
+    table = DailyMetric.__table__
+    statement = upsert(table).values(date=day, updated_at=datetime.utcnow(), **deltas)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.date],
+        set_={
+            **{name: table.c[name] + statement.excluded[name] for name in deltas},
+            'updated_at': statement.excluded.updated_at
+        }
+    )
+    db.session.execute(statement)
+
+def _bump_bookings(day, service_id, status, delta):
+    table = DailyBookingMetric.__table__
+    statement = upsert(table).values(date=day, service_id=service_id, status=status, count=delta)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.date, table.c.service_id, table.c.status],
+        set_={'count': table.c.count + statement.excluded['count']}
+    )
+    db.session.execute(statement)
+
+def record_payment_completed(payment):
+    _bump_daily(_day(payment.payment_date), revenue=payment.amount or 0, payments_count=1)
+
+def record_user_registered(user):
+    _bump_daily(_day(user.created_at), new_users=1)
+
+def record_enrollment(enrollment):
+    _bump_daily(_day(enrollment.enrollment_date), new_enrollments=1)
+
+def record_booking_created(booking):
+    day = _day(booking.created_at)
+    _bump_daily(day, new_bookings=1)
+    _bump_bookings(day, booking.service_id, booking.status, 1)
+
+def record_booking_status_change(booking, old_status):
+    """Move a booking between status buckets of the day it was created"""
+    if old_status == booking.status:
+        return
+    day = _day(booking.created_at)
+    _bump_bookings(day, booking.service_id, old_status, -1)
+    _bump_bookings(day, booking.service_id, booking.status, 1)
+
+def backfill(start_date=None, end_date=None):
+    """Rebuild the rollup tables from the raw rows, optionally for a date range"""
+    def in_range(query, column):
+        # Rows without a date (the columns are nullable) have no day to count in
+        query = query.filter(column.isnot(None))
+        if start_date:
+            query = query.filter(column >= datetime.combine(start_date, datetime.min.time()))
+        if end_date:
+            query = query.filter(column < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+        return query
+
+    daily = {}
+    def totals(day):
+        return daily.setdefault(day, {
+            'revenue': 0.0, 'payments_count': 0, 'new_users': 0, 'new_bookings': 0, 'new_enrollments': 0
+        })
+
+    payment_day = day_of(Payment.payment_date)
+    for day, revenue, count in in_range(db.session.query(
+        payment_day, func.sum(Payment.amount), func.count(Payment.id)
+    ).filter(Payment.status == 'completed'), Payment.payment_date).group_by(payment_day):
+        totals(day).update(revenue=float(revenue or 0), payments_count=count)
+
+    user_day = day_of(User.created_at)
+    for day, count in in_range(db.session.query(user_day, func.count(User.id)), User.created_at).group_by(user_day):
+        totals(day)['new_users'] = count
+
+    enrollment_day = day_of(CourseEnrollment.enrollment_date)
+    for day, count in in_range(
+        db.session.query(enrollment_day, func.count(CourseEnrollment.id)), CourseEnrollment.enrollment_date
+    ).group_by(enrollment_day):
+        totals(day)['new_enrollments'] = count
+
+    booking_day = day_of(Booking.created_at)
+    booking_rows = in_range(db.session.query(
+        booking_day, Booking.service_id, Booking.status, func.count(Booking.id)
+    ), Booking.created_at).group_by(booking_day, Booking.service_id, Booking.status).all()
+    for day, service_id, status, count in booking_rows:
+        totals(day)['new_bookings'] += count
+
+    daily_query = DailyMetric.query
+    booking_query = DailyBookingMetric.query
+    if start_date:
+        daily_query = daily_query.filter(DailyMetric.date >= start_date)
+        booking_query = booking_query.filter(DailyBookingMetric.date >= start_date)
+    if end_date:
+        daily_query = daily_query.filter(DailyMetric.date <= end_date)
+        booking_query = booking_query.filter(DailyBookingMetric.date <= end_date)
+    daily_query.delete(synchronize_session=False)
+    booking_query.delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    if daily:
+        db.session.execute(DailyMetric.__table__.insert(), [
+            {'date': day, 'updated_at': now, **values} for day, values in daily.items()
+        ])
+    if booking_rows:
+        db.session.execute(DailyBookingMetric.__table__.insert(), [
+            {'date': day, 'service_id': service_id, 'status': status, 'count': count}
+            for day, service_id, status, count in booking_rows
+        ])
+    db.session.commit()
+    return len(daily)
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+def bucket_label(day, bucket):
+    return day.strftime('%Y-%m') if bucket == 'month' else day.isoformat()
+
+def daily_series(start_date, end_date, bucket, **columns):
+    """Sum rollup columns into day/week/month buckets, including empty ones.
+
+    columns maps output keys to DailyMetric attributes, e.g.
+    revenue=DailyMetric.revenue. Returns a list of dicts with a 'date' key.
+    """
+    rows = db.session.query(DailyMetric.date, *columns.values()).filter(
+        DailyMetric.date >= start_date,
+        DailyMetric.date <= end_date
+    ).all()
+
+    buckets = {}
+    day = bucket_start(start_date, bucket)
+    while day <= end_date:
+        buckets[day] = dict.fromkeys(columns, 0)
+        day = (day.replace(day=28) + timedelta(days=4)).replace(day=1) if bucket == 'month' else \
+            day + timedelta(days=7 if bucket == 'week' else 1)
+
+    for row in rows:
+        totals = buckets[bucket_start(row[0], bucket)]
+        for key, value in zip(columns, row[1:]):
+            totals[key] += value or 0
+
+    return [{'date': bucket_label(day, bucket), **totals} for day, totals in buckets.items()]
+
+metrics_cli = AppGroup('metrics', help='Daily metrics rollup maintenance.')
+
+@metrics_cli.command('backfill')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild.')
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild.')
+def backfill_command(start_date, end_date):
+    """Rebuild daily_metrics and daily_booking_metrics from the raw tables."""
+    days = backfill(start_date.date() if start_date else None, end_date.date() if end_date else None)
+    click.echo(f'Rebuilt {days} day(s) of metrics')
@@ -0,0 +1,98 @@
+import base64
+import json
+from datetime import date, datetime, time
+from flask import request
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, time):
+        return {'t': value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 't' in value:
+            return time.fromisoformat(value['t'])
+    return value
+
+def encode_cursor(values):
+    """Opaque cursor for the sort key of the last row on a page"""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Sort key values from encode_cursor(); raises ValueError on a bad cursor"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return [_decode_value(value) for value in values]
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """One page of query ordered by columns, starting after cursor.
+
+    columns must end with a unique column (usually the primary key) so the
+    sort key is total. Returns (rows, next_cursor); next_cursor is None on
+    the last page. Rows may be entities or result rows; key values are read
+    back by column key, falling back to the row's first entity.
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            raise ValueError('Invalid cursor')
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([_key_value(last, column) for column in columns])
+    return rows, next_cursor
+
+def _key_value(row, column):
+    mapping = getattr(row, '_mapping', None)
+    if mapping is None:
+        return getattr(row, column.key)
+    if column.key in mapping:
+        return mapping[column.key]
+    # Result rows (entity, extra columns...) carry the rest on the entity
+    return getattr(row[0], column.key)
+
+def page_info(next_cursor, limit):
+    """The pagination block every cursor-paginated listing returns"""
+    return {'limit': limit, 'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+
+def paginate(query, columns, descending=True):
+    """keyset_page() driven by the request's ?cursor= and ?limit= arguments.
+
+    Returns (rows, pagination) where pagination is page_info(). Raises
+    ValueError for a malformed cursor.
+    """
+    limit = page_size(request.args.get('limit'))
+    rows, next_cursor = keyset_page(query, columns, request.args.get('cursor'), limit, descending)
+    return rows, page_info(next_cursor, limit)
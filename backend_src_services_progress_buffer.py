@@ -0,0 +1,128 @@
+import atexit
+import logging
+import threading
+from sqlalchemy import and_, bindparam
+from src.db import db
+from src.models.course import LessonProgress
+
+logger = logging.getLogger(__name__)
+
+class WatchTimeBuffer:
+    """Write-behind buffer for lesson watch-time heartbeats.
+
+    Heartbeats only overwrite LessonProgress.watch_time_seconds, so the
+    buffer keeps the latest value per (enrollment_id, lesson_id) in memory
+    and writes them out in one executemany UPDATE, either every
+    WATCH_TIME_FLUSH_INTERVAL seconds or once WATCH_TIME_MAX_PENDING keys
+    are waiting. Completion changes bypass the buffer and are committed
+    immediately by the route; they call discard() first so an older
+    buffered value can never overwrite them.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.flush_interval = 5.0
+        self.max_pending = 500
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('WATCH_TIME_FLUSH_INTERVAL', 5.0)
+        self.max_pending = app.config.get('WATCH_TIME_MAX_PENDING', 500)
+        app.extensions['watch_time_buffer'] = self
+        atexit.register(self.drain)
+
+    def record(self, enrollment_id, lesson_id, watch_time_seconds):
+        with self._lock:
+            self._pending[(enrollment_id, lesson_id)] = watch_time_seconds
+            pending_count = len(self._pending)
+
+        self._ensure_worker()
+        if pending_count >= self.max_pending:
+            self._wakeup.set()
+
+    def discard(self, enrollment_id, lesson_id):
+        """Remove and return the buffered value for one lesson, if any.
+
+        Waits for an in-flight flush so the caller's synchronous write is
+        always the last one to reach the row.
+        """
+        with self._flush_lock:
+            with self._lock:
+                return self._pending.pop((enrollment_id, lesson_id), None)
+
+    def pending_for(self, enrollment_id):
+        """Buffered watch times for one enrollment, keyed by lesson_id"""
+        with self._lock:
+            return {
+                lesson_id: seconds
+                for (pending_enrollment_id, lesson_id), seconds in self._pending.items()
+                if pending_enrollment_id == enrollment_id
+            }
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+
+            if not batch:
+                return 0
+
+            table = LessonProgress.__table__
+            statement = table.update().where(
+                and_(
+                    table.c.enrollment_id == bindparam('b_enrollment_id'),
+                    table.c.lesson_id == bindparam('b_lesson_id')
+                )
+            ).values(watch_time_seconds=bindparam('b_watch_time_seconds'))
+
+            rows = [
+                {
+                    'b_enrollment_id': enrollment_id,
+                    'b_lesson_id': lesson_id,
+                    'b_watch_time_seconds': seconds
+                }
+                for (enrollment_id, lesson_id), seconds in batch.items()
+            ]
+
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(statement, rows)
+            except Exception:
+                logger.exception('Failed to flush %d watch-time updates', len(rows))
+                # Put the batch back unless a newer heartbeat replaced it meanwhile
+                with self._lock:
+                    for key, seconds in batch.items():
+                        self._pending.setdefault(key, seconds)
+                return 0
+
+            return len(rows)
+
+    def drain(self):
+        """Flush everything still buffered; registered as a shutdown hook"""
+        if self.app is not None:
+            self.flush()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='watch-time-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+watch_time_buffer = WatchTimeBuffer()
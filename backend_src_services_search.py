@@ -0,0 +1,318 @@
+import logging
+import re
+import sqlite3
+import unicodedata
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, and_, bindparam, event, inspect, literal, or_, select, text
+from src.db import db
+from src.models.user import User
+from src.models.course import Course
+from src.models.marketing import NewsletterSubscriber
+
+logger = logging.getLogger(__name__)
+
+# Tashkeel, Quranic marks and tatweel carry no meaning for search
+ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+
+# Hamza/alef variants and letters commonly typed interchangeably
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه'
+})
+
+def normalize_text(value):
+    """Fold text so 'أحمد', 'احمد' and 'أَحْمَد' index and match the same way"""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKC', str(value))
+    value = ARABIC_MARKS.sub('', value)
+    return value.translate(ARABIC_LETTERS).casefold()
+
+def query_terms(q):
+    return re.findall(r'\w+', normalize_text(q))
+
+class Fts5Backend:
+    """One SQLite FTS5 table per document kind, keyed by rowid = ref_id"""
+
+    name = 'fts5'
+
+    @staticmethod
+    def available():
+        try:
+            connection = sqlite3.connect(':memory:')
+            connection.execute('CREATE VIRTUAL TABLE probe USING fts5(content)')
+            connection.close()
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def table_name(self, kind):
+        return f'search_{kind}'
+
+    def create(self, connection, kind):
+        table = self.table_name(kind)
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table}
+        ).first()
+        if exists:
+            return False
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {table} USING fts5(content, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        return True
+
+    def index(self, connection, kind, rows):
+        table = self.table_name(kind)
+        connection.execute(text(f'DELETE FROM {table} WHERE rowid = :ref_id'), rows)
+        connection.execute(text(f'INSERT INTO {table} (rowid, content) VALUES (:ref_id, :content)'), rows)
+
+    def remove(self, connection, kind, ref_id):
+        connection.execute(text(f'DELETE FROM {self.table_name(kind)} WHERE rowid = :ref_id'), {'ref_id': ref_id})
+
+    def clear(self, connection, kind):
+        connection.execute(text(f'DELETE FROM {self.table_name(kind)}'))
+
+    def matches(self, kind, terms):
+        table = self.table_name(kind)
+        # Every term must match, each as a prefix; rank is bm25 (lower is better)
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return text(
+            f'SELECT rowid AS ref_id, rank AS score FROM {table} WHERE {table} MATCH :match'
+        ).bindparams(match=match).columns(ref_id=Integer, score=Float).subquery()
+
+class SimpleBackend:
+    """Portable fallback: normalized text in a plain table, matched with LIKE"""
+
+    name = 'simple'
+
+    def __init__(self):
+        self.metadata = MetaData()
+        self.documents = Table(
+            'search_documents', self.metadata,
+            Column('kind', String(50), primary_key=True),
+            Column('ref_id', Integer, primary_key=True),
+            Column('content', Text)
+        )
+
+    def create(self, connection, kind):
+        if inspect(connection).has_table('search_documents'):
+            # Created once for every kind; rebuild a kind that has no rows yet
+            return connection.execute(
+                select(literal(1)).where(self.documents.c.kind == kind).limit(1)
+            ).first() is None
+        self.metadata.create_all(connection)
+        return True
+
+    def index(self, connection, kind, rows):
+        documents = self.documents
+        connection.execute(documents.delete().where(and_(
+            documents.c.kind == kind, documents.c.ref_id == bindparam('ref_id')
+        )), rows)
+        # Store the words space-separated, as FTS5 would tokenize them, so
+        # matches() can find a word start with LIKE
+        connection.execute(documents.insert(), [
+            dict(row, kind=kind, content=' '.join(query_terms(row['content']))) for row in rows
+        ])
+
+    def remove(self, connection, kind, ref_id):
+        documents = self.documents
+        connection.execute(documents.delete().where(and_(
+            documents.c.kind == kind, documents.c.ref_id == ref_id
+        )))
+
+    def clear(self, connection, kind):
+        connection.execute(self.documents.delete().where(self.documents.c.kind == kind))
+
+    def matches(self, kind, terms):
+        documents = self.documents
+        return select(
+            documents.c.ref_id.label('ref_id'),
+            literal(0.0).label('score')
+        ).where(
+            documents.c.kind == kind,
+            *[or_(
+                documents.c.content.startswith(term, autoescape=True),
+                documents.c.content.contains(' ' + term, autoescape=True)
+            ) for term in terms]
+        ).subquery()
+
+class PostgresBackend:
+    """PostgreSQL full-text search: one tsvector per document under a GIN index"""
+
+    name = 'postgresql'
+
+    def create(self, connection, kind):
+        if inspect(connection).has_table('search_vectors'):
+            # Created once for every kind; rebuild a kind that has no rows yet
+            return connection.execute(
+                text('SELECT 1 FROM search_vectors WHERE kind = :kind LIMIT 1'), {'kind': kind}
+            ).first() is None
+        connection.execute(text(
+            'CREATE TABLE search_vectors ('
+            '  kind VARCHAR(50) NOT NULL, ref_id INTEGER NOT NULL, content TSVECTOR NOT NULL,'
+            '  PRIMARY KEY (kind, ref_id)'
+            ')'
+        ))
+        connection.execute(text('CREATE INDEX ix_search_vectors_content ON search_vectors USING GIN (content)'))
+        return True
+
+    def index(self, connection, kind, rows):
+        # The 'simple' configuration only lowercases; normalize_text already
+        # folded the text, and joining the words keeps emails and URLs from
+        # being parsed as single tokens
+        connection.execute(text(
+            'INSERT INTO search_vectors (kind, ref_id, content) '
+            "VALUES (:kind, :ref_id, to_tsvector('simple', :content)) "
+            'ON CONFLICT (kind, ref_id) DO UPDATE SET content = excluded.content'
+        ), [dict(row, kind=kind, content=' '.join(query_terms(row['content']))) for row in rows])
+
+    def remove(self, connection, kind, ref_id):
+        connection.execute(
+            text('DELETE FROM search_vectors WHERE kind = :kind AND ref_id = :ref_id'),
+            {'kind': kind, 'ref_id': ref_id}
+        )
+
+    def clear(self, connection, kind):
+        connection.execute(text('DELETE FROM search_vectors WHERE kind = :kind'), {'kind': kind})
+
+    def matches(self, kind, terms):
+        # Every term must match, each as a prefix; negated ts_rank so that,
+        # as with bm25, lower scores are better
+        query = ' & '.join(f"'{term}':*" for term in terms)
+        return text(
+            "SELECT ref_id, -ts_rank(content, to_tsquery('simple', :search_query)) AS score "
+            'FROM search_vectors '
+            "WHERE kind = :search_kind AND content @@ to_tsquery('simple', :search_query)"
+        ).bindparams(search_kind=kind, search_query=query).columns(ref_id=Integer, score=Float).subquery()
+
+BACKENDS = {
+    'fts5': Fts5Backend,
+    'postgresql': PostgresBackend,
+    'simple': SimpleBackend
+}
+
+class SearchIndex:
+    """Full-text index over registered models.
+
+    Each document kind maps a model to the attributes whose text is
+    indexed. ORM flush events write index rows on the flushing connection,
+    so the index commits or rolls back with the change itself. The backend
+    comes from SEARCH_BACKEND, which defaults to 'postgresql' on PostgreSQL
+    and 'fts5' elsewhere; 'simple' is used when FTS5 is asked for but the
+    database is not SQLite or lacks FTS5.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self._documents = {}
+
+    def init_app(self, app):
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+        name = app.config.get('SEARCH_BACKEND', 'postgresql' if uri.startswith('postgresql') else 'fts5')
+        if name == 'fts5' and not (uri.startswith('sqlite') and Fts5Backend.available()):
+            logger.warning('FTS5 is not available; using the simple search backend')
+            name = 'simple'
+        self.backend = BACKENDS[name]()
+        app.extensions['search_index'] = self
+
+    def register(self, kind, model, fields):
+        self._documents[kind] = (model, fields)
+
+        def inserted(mapper, connection, target):
+            if self.backend is not None:
+                self.backend.index(connection, kind, [self._document(kind, target)])
+
+        def updated(mapper, connection, target):
+            # Logins and status flips touch rows constantly; skip those
+            state = inspect(target)
+            if self.backend is not None and any(state.attrs[field].history.has_changes() for field in fields):
+                self.backend.index(connection, kind, [self._document(kind, target)])
+
+        def removed(mapper, connection, target):
+            if self.backend is not None:
+                self.backend.remove(connection, kind, target.id)
+
+        event.listen(model, 'after_insert', inserted)
+        event.listen(model, 'after_update', updated)
+        event.listen(model, 'after_delete', removed)
+
+    def _document(self, kind, target):
+        model, fields = self._documents[kind]
+        content = ' '.join(str(getattr(target, field)) for field in fields if getattr(target, field))
+        return {'ref_id': target.id, 'content': normalize_text(content)}
+
+    def create_all(self):
+        """Create missing index tables and fill them from the existing rows"""
+        created = []
+        with db.engine.begin() as connection:
+            for kind in self._documents:
+                if self.backend.create(connection, kind):
+                    created.append(kind)
+        for kind in created:
+            self.rebuild(kind)
+        return created
+
+    def rebuild(self, kind, batch_size=1000):
+        model, fields = self._documents[kind]
+        table = model.__table__
+        count = 0
+        last_id = 0
+        # Read and write on one connection so SQLite never sees a competing reader
+        with db.engine.begin() as connection:
+            self.backend.clear(connection, kind)
+            while True:
+                rows = connection.execute(
+                    select(table).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                self.backend.index(connection, kind, [self._document(kind, row) for row in rows])
+                count += len(rows)
+                last_id = rows[-1].id
+        return count
+
+    def matches(self, kind, q):
+        """Subquery of (ref_id, score) rows matching q, or None when q has no terms.
+
+        Join it to the model and order by score for ranked results.
+        """
+        terms = query_terms(q)
+        if not terms:
+            return None
+        return self.backend.matches(kind, terms)
+
+search_index = SearchIndex()
+search_index.register('users', User, ['username', 'email', 'first_name', 'last_name'])
+search_index.register('courses', Course, ['title_ar', 'title_en', 'description_ar', 'description_en'])
+search_index.register('subscribers', NewsletterSubscriber, ['email', 'name', 'tags'])
+
+def search_join(query, kind, model, q):
+    """Join the matches for q onto query.
+
+    Returns (query, score) where score is the rank column to order by, or
+    (query, None) when q has no searchable terms.
+    """
+    hits = search_index.matches(kind, q)
+    if hits is None:
+        return query, None
+    return query.join(hits, hits.c.ref_id == model.id), hits.c.score
+
+def search_filter(query, kind, model, q):
+    """Restrict query to rows matching q, best matches first"""
+    query, score = search_join(query, kind, model, q)
+    if score is None:
+        return query
+    return query.order_by(score, model.id)
+
+search_cli = AppGroup('search', help='Full-text search index maintenance.')
+
+@search_cli.command('rebuild')
+@click.argument('kinds', nargs=-1)
+def rebuild_command(kinds):
+    """Rebuild the search index for KINDS (default: every kind)."""
+    search_index.create_all()
+    for kind in kinds or list(search_index._documents):
+        click.echo(f'{kind}: indexed {search_index.rebuild(kind)} row(s)')
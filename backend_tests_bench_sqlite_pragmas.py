@@ -0,0 +1,70 @@
+"""Mixed read/write load against SQLite under each pragma profile.
+
+Not part of the test run. From the backend directory:
+
+    python tests/bench_sqlite_pragmas.py [seconds]
+
+Writer threads update and insert rows while reader threads aggregate the
+table, and each profile reports how many of each finished and how many
+failed (typically "database is locked").
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db import SQLITE_PRAGMA_PROFILES, _apply_pragmas, sqlite_pragmas
+
+WRITERS = 4
+READERS = 8
+ROWS = 5000
+
+def run(profile, seconds):
+    path = os.path.join(tempfile.mkdtemp(), f'bench_{profile}.db')
+    engine = create_engine(f'sqlite:///{path}', pool_size=WRITERS + READERS, max_overflow=0)
+    event.listen(engine, 'connect', _apply_pragmas(sqlite_pragmas({'SQLITE_PRAGMA_PROFILE': profile})))
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)'))
+        connection.execute(text('INSERT INTO t (v) VALUES ' + ','.join(['(0)'] * ROWS)))
+
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def write():
+        with engine.begin() as connection:
+            connection.execute(text(f'UPDATE t SET v = v + 1 WHERE id = abs(random()) % {ROWS}'))
+            connection.execute(text('INSERT INTO t (v) VALUES (1)'))
+
+    def read():
+        with engine.connect() as connection:
+            connection.execute(text('SELECT sum(v) FROM t')).scalar()
+
+    def loop(work, key):
+        while time.monotonic() < stop:
+            try:
+                work()
+                outcome = key
+            except Exception:
+                outcome = 'errors'
+            with lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=loop, args=(write, 'writes')) for _ in range(WRITERS)]
+    threads += [threading.Thread(target=loop, args=(read, 'reads')) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counts
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for profile in SQLITE_PRAGMA_PROFILES:
+        counts = run(profile, seconds)
+        print(f"{profile:<12} reads {counts['reads']:>7}  writes {counts['writes']:>6}  errors {counts['errors']:>5}")
@@ -0,0 +1,74 @@
+"""Shared fixtures for the backend tests.
+
+Run from the backend directory with ``python -m pytest tests``. The suite
+uses a throwaway SQLite file unless TEST_DATABASE_URL points at another
+database (e.g. a local PostgreSQL); that database is emptied first, so
+never point it at real data.
+"""
+import itertools
+import os
+import sys
+import tempfile
+import pytest
+from sqlalchemy import MetaData
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app reads its database from the environment when src.main is imported
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or \
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+PASSWORD = 'Passw0rd!'
+
+_sequence = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+    from src.db import db
+    from src.migrations.runner import upgrade
+
+    with app.app_context():
+        metadata = MetaData()
+        metadata.reflect(db.engine)
+        metadata.drop_all(db.engine)
+        upgrade()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+@pytest.fixture
+def make_user(app):
+    from src.db import db
+    from src.models.user import User
+
+    def make_user(role='user'):
+        n = next(_sequence)
+        with app.app_context():
+            user = User(username=f'user{n}', email=f'user{n}@example.com', first_name='Test', last_name=f'User{n}', role=role)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+            return user.id, user.email
+    return make_user
+
+@pytest.fixture
+def login(app):
+    def login(email):
+        client = app.test_client()
+        response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+        assert response.status_code == 200, response.get_json()
+        return client
+    return login
+
+@pytest.fixture
+def service(app):
+    from src.db import db
+    from src.models.booking import Service
+
+    with app.app_context():
+        service = Service(name_ar='جلسة', name_en='Session', price=50, duration_minutes=60)
+        db.session.add(service)
+        db.session.commit()
+        return service.id
@@ -0,0 +1,47 @@
+"""Concurrent requests for one slot: the uq_bookings_active_slot index lets exactly one win."""
+import threading
+from datetime import date, timedelta
+
+CLIENTS = 12
+
+def book_concurrently(clients, payload):
+    barrier = threading.Barrier(len(clients))
+    statuses = [None] * len(clients)
+
+    def book(index, client):
+        barrier.wait()
+        statuses[index] = client.post('/api/bookings', json=payload).status_code
+
+    threads = [threading.Thread(target=book, args=pair) for pair in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+def test_only_one_concurrent_booking_per_slot_succeeds(app, make_user, login, service):
+    from src.db import db
+    from src.models.booking import Booking
+
+    clients = [login(make_user()[1]) for _ in range(CLIENTS)]
+    booking_date = date.today() + timedelta(days=7)
+    payload = {'service_id': service, 'booking_date': booking_date.isoformat(), 'booking_time': '10:30'}
+
+    statuses = book_concurrently(clients, payload)
+
+    assert sorted(statuses) == [201] + [409] * (CLIENTS - 1)
+    with app.app_context():
+        assert db.session.query(Booking).filter_by(service_id=service, booking_date=booking_date).count() == 1
+
+def test_cancelled_booking_releases_the_slot(app, make_user, login, service):
+    first, second = login(make_user()[1]), login(make_user()[1])
+    booking_date = date.today() + timedelta(days=8)
+    payload = {'service_id': service, 'booking_date': booking_date.isoformat(), 'booking_time': '12:00'}
+
+    response = first.post('/api/bookings', json=payload)
+    assert response.status_code == 201
+    assert second.post('/api/bookings', json=payload).status_code == 409
+
+    booking_id = response.get_json()['booking']['id']
+    assert first.post(f'/api/bookings/{booking_id}/cancel').status_code == 200
+    assert second.post('/api/bookings', json=payload).status_code == 201
@@ -0,0 +1,62 @@
+"""The dialect-aware SQL helpers render correctly for SQLite and PostgreSQL."""
+from datetime import date, datetime
+import pytest
+from sqlalchemy import literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+DIALECTS = {'sqlite': sqlite.dialect(), 'postgresql': postgresql.dialect()}
+
+def _sql(statement, dialect):
+    return ' '.join(str(statement.compile(dialect=DIALECTS[dialect])).split())
+
+@pytest.mark.parametrize('dialect, expected', [
+    ('sqlite', 'date(payments.payment_date)'),
+    ('postgresql', 'CAST(payments.payment_date AS DATE)'),
+])
+def test_day_of_compiles(app, dialect, expected):
+    from src.db import day_of
+    from src.models.membership import Payment
+
+    assert expected in _sql(select(day_of(Payment.payment_date)), dialect)
+
+def test_day_of_returns_a_date(app):
+    from src.db import db, day_of
+
+    with app.app_context():
+        value = db.session.execute(select(day_of(literal(datetime(2026, 3, 14, 23, 30))))).scalar()
+    assert value == date(2026, 3, 14)
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_upsert_compiles(app, dialect):
+    from src.db import upsert
+    from src.models.metrics import DailyBookingMetric
+
+    table = DailyBookingMetric.__table__
+    statement = upsert(table, dialect).values(date=date(2026, 3, 14), service_id=1, status='confirmed', count=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.date, table.c.service_id, table.c.status],
+        set_={'count': table.c.count + statement.excluded['count']}
+    )
+
+    assert 'ON CONFLICT (date, service_id, status) DO UPDATE SET count = ' \
+        '(daily_booking_metrics.count + excluded.count)' in _sql(statement, dialect)
+
+def test_upsert_rejects_unknown_dialect(app):
+    from src.db import upsert
+    from src.models.metrics import DailyBookingMetric
+
+    with pytest.raises(NotImplementedError):
+        upsert(DailyBookingMetric.__table__, 'mysql')
+
+def test_upsert_bumps_existing_row(app, service):
+    from src.db import db
+    from src.models.metrics import DailyBookingMetric
+    from src.services.metrics import _bump_bookings
+
+    day = date(2026, 3, 14)
+    with app.app_context():
+        for _ in range(3):
+            _bump_bookings(day, service, 'confirmed', 1)
+        db.session.commit()
+        rows = DailyBookingMetric.query.filter_by(date=day, service_id=service).all()
+        assert [(row.status, row.count) for row in rows] == [('confirmed', 3)]
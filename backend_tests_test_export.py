@@ -0,0 +1,36 @@
+"""CSV exports neutralize spreadsheet formulas from user-supplied text."""
+import csv
+import io
+import json
+import pytest
+
+@pytest.mark.parametrize('name', ['=HYPERLINK("http://example.com","x")', '+1+1', '-2+3', '@SUM(A1)'])
+def test_subscriber_export_quotes_formula_cells(app, make_user, login, name):
+    from src.db import db
+    from src.models.marketing import NewsletterSubscriber
+
+    with app.app_context():
+        NewsletterSubscriber.query.delete()
+        db.session.commit()
+    client = app.test_client()
+    response = client.post('/api/newsletter/subscribe', json={'email': 'formula@example.com', 'name': name})
+    assert response.status_code in (200, 201)
+    admin = login(make_user('admin')[1])
+
+    response = admin.get('/api/admin/newsletter/subscribers/export?format=csv')
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True).lstrip('\ufeff'))))
+    assert [row['name'] for row in rows] == ["'" + name]
+
+    # NDJSON is data, not a spreadsheet, and keeps the value as entered
+    response = admin.get('/api/admin/newsletter/subscribers/export?format=ndjson')
+    assert [json.loads(line)['name'] for line in response.get_data(as_text=True).splitlines()] == [name]
+
+def test_csv_cells():
+    from src.services.export import _csv_cell
+
+    assert _csv_cell('\tcmd') == "'\tcmd"
+    assert _csv_cell('\rcmd') == "'\rcmd"
+    assert _csv_cell('Omar') == 'Omar'
+    # Only text is quoted; a negative amount stays a number
+    assert _csv_cell(-5) == -5
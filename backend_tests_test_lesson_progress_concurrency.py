@@ -0,0 +1,72 @@
+"""Concurrent progress updates for one enrollment: no row or completion is lost."""
+import threading
+
+CLIENTS = 6
+
+def enroll_in_new_course(app, user_id, lessons):
+    """Create a published course with the given number of lessons; returns (course_id, lesson_ids)"""
+    from src.db import db
+    from src.models.course import Course, CourseModule, CourseLesson, CourseEnrollment
+
+    with app.app_context():
+        course = Course(title_ar='دورة', title_en='Course', description_ar='وصف', description_en='Description',
+                        is_published=True, is_free=True)
+        db.session.add(course)
+        db.session.flush()
+        module = CourseModule(course_id=course.id, title_ar='وحدة', title_en='Module', order=1, is_published=True)
+        db.session.add(module)
+        db.session.flush()
+        course_lessons = [
+            CourseLesson(module_id=module.id, title_ar='درس', title_en=f'Lesson {n}', order=n, is_published=True)
+            for n in range(1, lessons + 1)
+        ]
+        db.session.add_all(course_lessons)
+        db.session.add(CourseEnrollment(user_id=user_id, course_id=course.id, status='active'))
+        db.session.commit()
+        return course.id, [lesson.id for lesson in course_lessons]
+
+def post_concurrently(clients, requests):
+    """POST (url, payload) pairs at once, one per client; returns the status codes"""
+    barrier = threading.Barrier(len(clients))
+    statuses = [None] * len(clients)
+
+    def post(index, client):
+        url, payload = requests[index]
+        barrier.wait()
+        statuses[index] = client.post(url, json=payload).status_code
+
+    threads = [threading.Thread(target=post, args=pair) for pair in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+def test_concurrent_first_heartbeats_share_one_row(app, make_user, login):
+    from src.db import db
+    from src.models.course import LessonProgress
+
+    user_id, email = make_user()
+    course_id, (lesson_id,) = enroll_in_new_course(app, user_id, 1)
+    url = f'/api/courses/{course_id}/lessons/{lesson_id}/progress'
+
+    statuses = post_concurrently([login(email) for _ in range(CLIENTS)], [(url, {'watch_time_seconds': 30})] * CLIENTS)
+
+    assert statuses == [200] * CLIENTS
+    with app.app_context():
+        assert db.session.query(LessonProgress).filter_by(lesson_id=lesson_id).count() == 1
+
+def test_concurrent_completions_all_count(app, make_user, login):
+    from src.db import db
+    from src.models.course import CourseEnrollment
+
+    user_id, email = make_user()
+    course_id, lesson_ids = enroll_in_new_course(app, user_id, CLIENTS)
+    requests = [(f'/api/courses/{course_id}/lessons/{lesson_id}/progress', {'is_completed': True}) for lesson_id in lesson_ids]
+    statuses = post_concurrently([login(email) for _ in range(CLIENTS)], requests)
+
+    assert statuses == [200] * CLIENTS
+    with app.app_context():
+        enrollment = db.session.query(CourseEnrollment).filter_by(user_id=user_id, course_id=course_id).one()
+        assert (enrollment.completed_lessons_count, enrollment.progress_percentage, enrollment.status) == \
+            (CLIENTS, 100.0, 'completed')
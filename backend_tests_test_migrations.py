@@ -0,0 +1,34 @@
+"""Upgrading databases created before the migration runner."""
+import os
+import shutil
+from flask import Flask
+from sqlalchemy import inspect
+
+# The database shipped with the app, bootstrapped with only the users table
+SHIPPED_DATABASE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'database', 'app.db')
+
+def test_upgrade_creates_missing_original_tables(app, tmp_path, monkeypatch):
+    from src.db import db, init_db
+    from src.migrations.runner import BASELINE_TABLES, current_version, latest_version, upgrade
+    from src.services.search import search_index
+
+    path = tmp_path / 'app.db'
+    shutil.copy(SHIPPED_DATABASE, path)
+    legacy = Flask(__name__)
+    legacy.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_db(legacy)
+    # The search index is process-wide; give it this app's backend for now
+    monkeypatch.setattr(search_index, 'backend', search_index.backend)
+    search_index.init_app(legacy)
+
+    with legacy.app_context():
+        assert 'lesson_progress' not in inspect(db.engine).get_table_names()
+
+        assert upgrade() == latest_version()
+
+        tables = set(inspect(db.engine).get_table_names())
+        assert set(BASELINE_TABLES) <= tables
+        assert {'daily_metrics', 'daily_booking_metrics'} <= tables
+        with db.engine.connect() as connection:
+            assert current_version(connection) == latest_version()
+        db.engine.dispose()
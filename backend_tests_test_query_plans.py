@@ -0,0 +1,67 @@
+"""The hot filters run as index searches on SQLite, not table scans."""
+import re
+import pytest
+from sqlalchemy import text
+
+HOT_QUERIES = [
+    # (description, SQL, indexes the planner may pick)
+    ('active subscription check',
+     "SELECT * FROM subscriptions WHERE user_id = 1 AND status = 'active' AND end_date > '2026-01-01'",
+     ('ix_subscriptions_user_status_end',)),
+    ('enrollment lookup',
+     "SELECT * FROM course_enrollments WHERE user_id = 1 AND course_id = 1 AND status = 'active'",
+     ('ix_course_enrollments_user_course',)),
+    ('course enrollment counts',
+     "SELECT course_id, COUNT(*) FROM course_enrollments WHERE course_id IN (1, 2) AND status = 'completed' GROUP BY course_id",
+     ('ix_course_enrollments_course_status',)),
+    ('lesson progress row',
+     'SELECT * FROM lesson_progress WHERE enrollment_id = 1 AND lesson_id = 2',
+     ('uq_lesson_progress_enrollment_lesson',)),
+    ('service availability',
+     "SELECT * FROM bookings WHERE service_id = 1 AND booking_date BETWEEN '2026-01-01' AND '2026-02-01' "
+     "AND status IN ('pending', 'confirmed')",
+     # Active statuses match the partial unique index, which SQLite may prefer
+     ('ix_bookings_service_date', 'uq_bookings_active_slot')),
+    ('my bookings',
+     'SELECT * FROM bookings WHERE user_id = 1 ORDER BY booking_date DESC',
+     ('ix_bookings_user_date',)),
+    ('admin booking list',
+     'SELECT * FROM bookings ORDER BY booking_date DESC, booking_time DESC LIMIT 50',
+     ('ix_bookings_date_time',)),
+    ('available slots',
+     "SELECT * FROM available_slots WHERE is_available = 1 AND date <= '2026-02-01'",
+     ('ix_available_slots_available_date',)),
+    ('revenue totals',
+     "SELECT SUM(amount) FROM payments WHERE status = 'completed' AND payment_date >= '2026-01-01'",
+     ('ix_payments_status_date',)),
+    ('user payment totals',
+     "SELECT user_id, SUM(amount) FROM payments WHERE user_id IN (1, 2) AND status = 'completed' GROUP BY user_id",
+     ('ix_payments_user_status',)),
+    ('course revenue',
+     "SELECT * FROM payments WHERE related_entity_type = 'course_enrollment' AND related_entity_id = 3",
+     ('ix_payments_related_entity',)),
+    ('newest users',
+     'SELECT * FROM users ORDER BY created_at DESC LIMIT 20',
+     ('ix_users_created_at',)),
+    ('newest subscribers',
+     'SELECT * FROM newsletter_subscribers ORDER BY subscribed_at DESC LIMIT 20',
+     ('ix_newsletter_subscribers_subscribed_at',)),
+]
+
+@pytest.fixture
+def connection(app):
+    from src.db import db
+
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip('EXPLAIN QUERY PLAN is SQLite-specific')
+        with db.engine.connect() as connection:
+            yield connection
+
+@pytest.mark.parametrize('sql, indexes', [query[1:] for query in HOT_QUERIES], ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_index(connection, sql, indexes):
+    plan = [row[3] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+    used = set(re.findall(r'USING (?:COVERING )?INDEX (\w+)', '\n'.join(plan)))
+    assert used & set(indexes), plan
+    assert not any(step.startswith('SCAN') and 'INDEX' not in step for step in plan), plan
@@ -0,0 +1,168 @@
+"""Read replica routing: @use_replica reads, sticky writers and a replica that is down.
+
+The replica is a second SQLite file refreshed from the primary with
+snapshot(), so anything written after the last snapshot is "replica lag".
+"""
+import os
+import sqlite3
+import time
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+PASSWORD = 'Passw0rd!'
+
+class ReplicaApp:
+    def __init__(self, app, primary_path, replica_path):
+        from src.db import db
+
+        self.app = app
+        self.primary_path = primary_path
+        self.replica_path = replica_path
+        self.queries = {}
+        with app.app_context():
+            for name, engine in (('primary', db.engines[None]), ('replica', db.engines['replica'])):
+                event.listen(engine, 'before_cursor_execute', self._counter(name))
+
+    def _counter(self, name):
+        def count(*args):
+            self.queries[name] = self.queries.get(name, 0) + 1
+        return count
+
+    def snapshot(self):
+        """Copy the primary over the replica, as if replication caught up"""
+        from src.db import db
+
+        with self.app.app_context():
+            db.engines['replica'].dispose()
+        source, target = sqlite3.connect(self.primary_path), sqlite3.connect(self.replica_path)
+        source.backup(target)
+        source.close()
+        target.close()
+
+    def get(self, client, url):
+        """GET url; returns (response, {engine name: query count})"""
+        self.queries.clear()
+        response = client.get(url)
+        return response, dict(self.queries)
+
+@pytest.fixture
+def replica_app(app, tmp_path, monkeypatch):
+    from src.db import db, init_db
+    from src.migrations.runner import upgrade
+    from src.models.user import User
+    from src.routes.auth import auth_bp
+    from src.routes.courses import courses_bp
+    from src.services.auth import init_auth
+    from src.services.cache import catalog_cache
+    from src.services.search import search_index
+
+    primary_path, replica_path = str(tmp_path / 'primary.db'), str(tmp_path / 'replica.db')
+    replicated = Flask(__name__)
+    replicated.config.update(
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary_path}',
+        SQLALCHEMY_REPLICA_URI=f'sqlite:///{replica_path}',
+    )
+    init_db(replicated)
+    init_auth(replicated)
+    # The search index is process-wide; give it this app's backend for now
+    monkeypatch.setattr(search_index, 'backend', search_index.backend)
+    search_index.init_app(replicated)
+    replicated.register_blueprint(auth_bp, url_prefix='/api/auth')
+    replicated.register_blueprint(courses_bp, url_prefix='/api')
+
+    with replicated.app_context():
+        upgrade()
+        for role in ('user', 'admin'):
+            user = User(username=role, email=f'{role}@example.com', first_name='Replica', last_name=role, role=role)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+
+    state = ReplicaApp(replicated, primary_path, replica_path)
+    state.snapshot()
+    catalog_cache.invalidate()
+    yield state
+    catalog_cache.invalidate()
+    with replicated.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+def add_course(replica_app, published=True):
+    from src.db import db
+    from src.models.course import Course
+
+    with replica_app.app.app_context():
+        course = Course(title_ar='دورة', title_en='Course', description_ar='وصف', description_en='Description',
+                        is_published=published)
+        db.session.add(course)
+        db.session.commit()
+        return course.id
+
+def login(replica_app, role):
+    client = replica_app.app.test_client()
+    response = client.post('/api/auth/login', json={'email': f'{role}@example.com', 'password': PASSWORD})
+    assert response.status_code == 200
+    return client
+
+def course_ids(response):
+    return [course['id'] for course in response.get_json()['courses']]
+
+def test_marked_views_read_from_the_replica(replica_app):
+    course_id = add_course(replica_app)
+
+    response, queries = replica_app.get(replica_app.app.test_client(), '/api/courses?show_all=true')
+
+    assert response.status_code == 200
+    assert queries.get('primary', 0) == 0 and queries['replica'] > 0
+    # Not replicated yet
+    assert course_id not in course_ids(response)
+
+def test_writer_sticks_to_the_primary(replica_app):
+    # Logging in records last_login, a write
+    client = login(replica_app, 'user')
+    with client.session_transaction() as user_session:
+        assert user_session['db_write_at'] > time.time() - 5
+    course_id = add_course(replica_app)
+
+    response, queries = replica_app.get(client, '/api/courses?show_all=true')
+    assert queries.get('replica', 0) == 0
+    assert course_id in course_ids(response)
+
+    # Once the sticky window has passed the replica serves the user again
+    with client.session_transaction() as user_session:
+        user_session['db_write_at'] = 0
+    response, queries = replica_app.get(client, '/api/courses?show_all=true')
+    assert queries.get('primary', 0) == 0 and queries['replica'] > 0
+
+def test_unreachable_replica_falls_back_to_the_primary(replica_app):
+    from src.db import db
+
+    # Replace the replica file with a directory SQLite cannot open
+    with replica_app.app.app_context():
+        db.engines['replica'].dispose()
+    os.remove(replica_app.replica_path)
+    os.mkdir(replica_app.replica_path)
+    client = replica_app.app.test_client()
+
+    # The request that finds it down fails; later ones skip the replica
+    replica_app.get(client, '/api/courses?show_all=true')
+    assert not replica_app.app.extensions['db_replica'].available
+
+    response, queries = replica_app.get(client, '/api/courses?show_all=true')
+    assert response.status_code == 200
+    assert queries.get('replica', 0) == 0 and queries['primary'] > 0
+
+def test_catalog_cache_is_not_filled_from_a_lagging_replica(replica_app):
+    course_id = add_course(replica_app, published=False)
+    replica_app.snapshot()
+    client = replica_app.app.test_client()
+    assert course_id not in course_ids(client.get('/api/courses'))
+
+    # Publishing clears the cached catalog; the replica has not caught up
+    admin = login(replica_app, 'admin')
+    assert admin.put(f'/api/admin/courses/{course_id}', json={'is_published': True}).status_code == 200
+
+    for _ in range(2):
+        assert course_id in course_ids(client.get('/api/courses'))
@@ -0,0 +1,51 @@
+"""Full-text search behaves the same on every backend: word prefixes, all terms, ranked."""
+import pytest
+
+@pytest.fixture
+def subscribers(app):
+    from src.db import db
+    from src.models.marketing import NewsletterSubscriber
+
+    with app.app_context():
+        NewsletterSubscriber.query.delete()
+        rows = [
+            NewsletterSubscriber(email='smith@example.com', name='Smith Smithson'),
+            NewsletterSubscriber(email='john@example.com', name='John Smith'),
+            NewsletterSubscriber(email='blacksmith@example.com', name='Anna Blacksmith'),
+            NewsletterSubscriber(email='ahmad@example.com', name='أَحْمَد إبراهيم'),
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        yield {row.email.split('@')[0]: row.id for row in rows}
+        NewsletterSubscriber.query.delete()
+        db.session.commit()
+
+def search(app, q):
+    from src.models.marketing import NewsletterSubscriber
+    from src.services.search import search_filter
+
+    with app.app_context():
+        return [row.id for row in search_filter(NewsletterSubscriber.query, 'subscribers', NewsletterSubscriber, q)]
+
+def test_backend_matches_the_database(app):
+    from src.db import db
+    from src.services.search import search_index
+
+    with app.app_context():
+        expected = 'postgresql' if db.engine.dialect.name == 'postgresql' else 'fts5'
+    assert search_index.backend.name == expected
+
+def test_terms_match_word_prefixes(app, subscribers):
+    assert set(search(app, 'smi')) == {subscribers['smith'], subscribers['john']}
+    assert search(app, 'ith') == []
+
+def test_every_term_must_match(app, subscribers):
+    assert search(app, 'john smi') == [subscribers['john']]
+    assert search(app, 'example') and search(app, 'example com anna') == [subscribers['blacksmith']]
+
+def test_arabic_spelling_variants_match(app, subscribers):
+    assert search(app, 'احمد ابراه') == [subscribers['ahmad']]
+
+def test_better_matches_rank_first(app, subscribers):
+    # 'smith' is in the email, the name and the surname of the first one
+    assert search(app, 'smith')[0] == subscribers['smith']